@@ -2,8 +2,7 @@
 """
 import typing as t
 from enum import Enum
-from json import loads
-from asyncio import Event
+from asyncio import Event, get_running_loop
 from dataclasses import dataclass
 from aiohttp import (
     TCPConnector,
@@ -12,13 +11,13 @@ from aiohttp import (
     ServerTimeoutError,
     ClientConnectorError,
 )
-from rich.prompt import Confirm
 from .helper.api import MarmotAPIMessage, MarmotMessageLevel
 from .helper.crypto import (
     sign_marmot_data_digest,
     create_marmot_ssl_context,
     hash_marmot_listen_params,
 )
+from .helper.json import loads, dumps
 from .helper.config import MarmotConfig
 from .helper.logging import LOGGER
 from .helper.event_source import event_source_stream
@@ -49,6 +48,33 @@ class MarmotMessage:
             'whistler': self.whistler,
         }
 
+    def to_env(self):
+        """Convert instance to executable environment variables"""
+        return {
+            'MARMOT_MSG_LEVEL': self.level.name,
+            'MARMOT_MSG_CHANNEL': self.channel,
+            'MARMOT_MSG_WHISTLER': self.whistler,
+            'MARMOT_MSG_CONTENT': self.content,
+        }
+
+
+@dataclass(frozen=True)
+class MarmotSubscription:
+    """Marmot subscription, signed once for a set of channels"""
+
+    guid: str
+    channels: t.FrozenSet[str]
+    channels_header: str
+    signature: str
+
+    def to_headers(self):
+        """Convert subscription to listen request headers"""
+        return {
+            'X-Marmot-GUID': self.guid,
+            'X-Marmot-Channels': self.channels_header,
+            'X-Marmot-Signature': self.signature,
+        }
+
 
 class Marmot:
     """Marmot"""
@@ -56,10 +82,37 @@ class Marmot:
     def __init__(self, config: MarmotConfig, client: ClientSession):
         self._config = config
         self._client = client
+        # private key is parsed once when loading configuration, keep a
+        # reference to it and to the guid for signing operations
+        self._guid = config.client.guid
+        self._prikey = config.client.prikey
+        self._subscriptions = {}
+
+    @staticmethod
+    def create_connector(config: MarmotConfig) -> TCPConnector:
+        """Create HTTP connector"""
+        is_secure = config.client.url.scheme == 'https'
+        sslctx = (
+            create_marmot_ssl_context(config.client.capath)
+            if is_secure
+            else None
+        )
+        # keep connections alive and reuse them to amortize TLS handshakes
+        return TCPConnector(
+            ssl=sslctx,
+            limit=100,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True,
+        )
 
     @staticmethod
-    def create_client(role: MarmotRole, config: MarmotConfig):
-        """Create HTTP client session"""
+    def create_client(
+        role: MarmotRole,
+        config: MarmotConfig,
+        connector: t.Optional[TCPConnector] = None,
+    ):
+        """Create HTTP client session, connector is not closed if given"""
         LOGGER.info("connecting to %s", config.client.url)
         is_secure = config.client.url.scheme == 'https'
         if not is_secure:
@@ -67,49 +120,59 @@ class Marmot:
                 "[red]!!! USING INSECURE PROTOCOL !!![/]",
                 extra={'markup': True},
             )
+            from rich.prompt import Confirm
+
             if not Confirm.ask("do you accept the risk?"):
                 raise KeyboardInterrupt
-        sslctx = (
-            create_marmot_ssl_context(config.client.capath)
-            if is_secure
-            else None
-        )
         timeout = (
             ClientTimeout(sock_connect=5)
             if role == MarmotRole.LISTENER
             else ClientTimeout(total=60, sock_connect=5)
         )
-        connector = TCPConnector(ssl=sslctx)
+        connector_owner = connector is None
+        if connector_owner:
+            connector = Marmot.create_connector(config)
         return ClientSession(
             connector=connector,
+            connector_owner=connector_owner,
             base_url=config.client.url,
             timeout=timeout,
             raise_for_status=False,
+            json_serialize=dumps,
         )
 
+    def subscribe(self, channels: t.Iterable[str]) -> MarmotSubscription:
+        """Build signed subscription to one or more channels"""
+        channels = frozenset(channels)
+        subscription = self._subscriptions.get(channels)
+        if subscription is None:
+            sorted_channels = sorted(channels)
+            subscription = MarmotSubscription(
+                guid=self._guid,
+                channels=channels,
+                channels_header='|'.join(sorted_channels),
+                signature=sign_marmot_data_digest(
+                    self._prikey,
+                    hash_marmot_listen_params(self._guid, sorted_channels),
+                ),
+            )
+            self._subscriptions[channels] = subscription
+        return subscription
+
     async def _listen(
-        self, channels: t.List[str], stop_event: Event
+        self, subscription: MarmotSubscription, stop_event: Event
     ) -> t.Iterator[MarmotMessage]:
-        guid = self._config.client.guid
-        headers = {
-            'X-Marmot-GUID': guid,
-            'X-Marmot-Channels': '|'.join(channels),
-            'X-Marmot-Signature': sign_marmot_data_digest(
-                self._config.client.prikey,
-                hash_marmot_listen_params(guid, channels),
-            ),
-        }
+        headers = subscription.to_headers()
         async with self._client.get('/api/listen', headers=headers) as resp:
             if resp.status != 200:
                 LOGGER.error("server sent status code: %s", resp.status)
                 return
             async for evt in event_source_stream(resp, stop_event):
-                event = evt.event.decode()
-                if event == 'reset':
+                if evt.event == b'reset':
                     LOGGER.warning("server sent a reset notification.")
                     break
-                if event == 'whistle':
-                    dct = loads(evt.data.decode())
+                if evt.event == b'whistle':
+                    dct = loads(evt.data)
                     message = MarmotAPIMessage.from_dict(dct)
                     yield MarmotMessage(
                         channel=message.channel,
@@ -122,33 +185,44 @@ class Marmot:
         self, channels: t.Set[str], stop_event: Event
     ) -> t.Iterator[MarmotMessage]:
         """Listen to one or more channels"""
-        channels = list(sorted(list(channels)))
+        if not channels:
+            return
+        subscription = self.subscribe(channels)
         try:
-            async for message in self._listen(channels, stop_event):
+            async for message in self._listen(subscription, stop_event):
                 yield message
         except ServerTimeoutError:
             LOGGER.critical("server seems unreachable!")
         except ClientConnectorError:
             LOGGER.critical("server refused connection!")
 
-    async def _whistle(self, messages: t.List[MarmotMessage]) -> t.List[bool]:
-        payload = {
-            'messages': [
+    def _build_whistle_payload(self, messages: t.List[MarmotMessage]):
+        guid = self._guid
+        api_messages = MarmotAPIMessage.sign_many(
+            [
                 MarmotAPIMessage(
                     channel=message.channel,
                     content=message.content,
-                    whistler=self._config.client.guid,
+                    whistler=guid,
                     level=message.level,
                 )
-                .sign(
-                    self._config.client.prikey,
-                )
-                .to_dict()
                 for message in messages
-            ]
+            ],
+            self._prikey,
+        )
+        return {
+            'messages': [api_message.to_dict() for api_message in api_messages]
         }
+
+    async def _whistle(self, messages: t.List[MarmotMessage]) -> t.List[bool]:
+        if not messages:
+            return []
+        # signing is CPU-bound, keep the event loop responsive meanwhile
+        payload = await get_running_loop().run_in_executor(
+            None, self._build_whistle_payload, messages
+        )
         async with self._client.post('/api/whistle', json=payload) as resp:
-            body = await resp.json()
+            body = loads(await resp.read())
             return body['published']
 
     async def whistle(self, messages: t.List[MarmotMessage]) -> t.List[bool]:
@@ -1,36 +1,20 @@
 """Marmot config application
 """
+# NOTE: rich components, cryptography and redis dependent modules are
+#       imported in the functions using them to keep --help and argument
+#       errors fast
+# NOTE: async handlers run configuration file I/O in a worker thread to keep
+#       the event loop free for backend I/O
+import sys
+import typing as t
+from asyncio import to_thread
 from re import compile as re_compile
-from json import dumps
-from uuid import uuid4
-from asyncio import new_event_loop
 from pathlib import Path
 from argparse import ArgumentParser
-from rich.box import ROUNDED
-from rich.text import Text
-from rich.tree import Tree
-from rich.panel import Panel
-from rich.table import Table
-from rich.prompt import Prompt, Confirm
-from rich.console import Console
+from functools import lru_cache
+from contextlib import contextmanager
 from .__version__ import version
-from .helper.config import (
-    validate_guid,
-    MarmotConfig,
-    MarmotConfigError,
-    MarmotRedisConfig,
-    MarmotClientConfig,
-    MarmotServerConfig,
-    DEFAULT_REDIS_URL,
-    DEFAULT_REDIS_MAXCONN,
-    DEFAULT_REDIS_TRIMFREQ,
-    DEFAULT_MARMOT_HOST,
-    DEFAULT_MARMOT_PORT,
-    DEFAULT_MARMOT_URL,
-    DEFAULT_MARMOT_CAPATH,
-)
-from .helper.crypto import generate_marmot_private_key, dump_marmot_public_key
-from .helper.backend import MarmotServerBackend
+from .helper.json import dumps
 from .helper.logging import LOGGER
 from .helper.secret_provider import (
     SECRET_PROVIDER,
@@ -40,25 +24,49 @@ from .helper.secret_provider import (
 
 
 BANNER = f"Marmot Config {version}"
-CONSOLE = Console()
 ADDED_STYLE = 'green'
 DELETED_STYLE = 'red'
+GUID_WIDTH = 36
+OUTPUT_FORMATS = ('rich', 'plain', 'csv', 'json')
 
 UNIX_URL_PATTERN = re_compile(r'password=([^&\n]+)')
 REDIS_URL_PATTERN = re_compile(r'(rediss?)://([^:/]+):([^@/]+)@(.*)')
+REDACTORS = (
+    (UNIX_URL_PATTERN, 'password=[REDACTED]'),
+    (REDIS_URL_PATTERN, r'\1://\2:[REDACTED]@\4'),
+)
+
+_LOOP = None
+_BACKENDS = {}
 
 
 def _redact_redis_url(url: str) -> str:
-    for pattern, repl in (
-        (UNIX_URL_PATTERN, 'password=[REDACTED]'),
-        (REDIS_URL_PATTERN, '\1://\2:[REDACTED]@\4'),
-    ):
+    for pattern, repl in REDACTORS:
         url = pattern.sub(repl, url)
     return url
 
 
+@lru_cache(maxsize=1)
+def _console():
+    from rich.console import Console
+
+    return Console()
+
+
+def _read_config(config: Path):
+    from .helper.config import MarmotConfig
+
+    return MarmotConfig.from_filepath(config)
+
+
+def _write_config(fs_config, config: Path):
+    fs_config.to_filepath(config)
+
+
 def _load_client_config(config: Path):
-    fs_config = MarmotConfig.from_filepath(config)
+    from .helper.config import MarmotConfigError
+
+    fs_config = _read_config(config)
     if not fs_config.client:
         LOGGER.error("cannot find client configuration in: %s", config)
         raise MarmotConfigError("cannot find client configuration")
@@ -66,110 +74,133 @@ def _load_client_config(config: Path):
 
 
 def _load_server_config(config: Path):
-    fs_config = MarmotConfig.from_filepath(config)
+    from .helper.config import MarmotConfigError
+
+    fs_config = _read_config(config)
     if not fs_config.server:
         LOGGER.error("cannot find server configuration in: %s", config)
         raise MarmotConfigError("cannot find server configuration")
     return fs_config
 
 
-async def _init_client(args):
-    fs_config = MarmotConfig()
-    if args.config.is_file():
-        fs_config = MarmotConfig.from_filepath(args.config)
+def _ask(args, prompt: str, default: str) -> str:
+    if args.use_defaults:
+        return default
+    from rich.prompt import Prompt
+
+    return Prompt.ask(prompt, default=default)
+
+
+def _init_client(args):
+    from uuid import uuid4
+    from yarl import URL
+    from .helper.config import (
+        validate_guid,
+        MarmotConfig,
+        MarmotClientConfig,
+        DEFAULT_MARMOT_URL,
+        DEFAULT_MARMOT_CAPATH,
+    )
+    from .helper.crypto import generate_marmot_private_key
+
+    fs_config = MarmotConfig.from_filepath_or_empty(args.config)
     if fs_config.client:
         LOGGER.warning(
             "client already initialized, client initialization canceled."
         )
         return
-    guid = str(uuid4())
     fs_config.client = MarmotClientConfig(
         guid=validate_guid(
-            guid
-            if args.use_defaults
-            else Prompt.ask("please enter marmot client guid", default=guid)
+            _ask(args, "please enter marmot client guid", str(uuid4()))
         ),
-        url=(
-            str(DEFAULT_MARMOT_URL)
-            if args.use_defaults
-            else Prompt.ask(
+        url=URL(
+            _ask(
+                args,
                 "please enter marmot server url",
-                default=str(DEFAULT_MARMOT_URL),
+                str(DEFAULT_MARMOT_URL),
             )
         ),
-        capath=(
-            str(DEFAULT_MARMOT_CAPATH)
-            if args.use_defaults
-            else Path(
-                Prompt.ask(
-                    "please enter marmot server CA path",
-                    default=str(DEFAULT_MARMOT_CAPATH),
-                )
+        capath=Path(
+            _ask(
+                args,
+                "please enter marmot server CA path",
+                str(DEFAULT_MARMOT_CAPATH),
             )
         ),
         prikey=generate_marmot_private_key(),
     )
     if args.use_defaults:
         SECRET_PROVIDER.select(SecretProviderBackend.GENPASS)
-    fs_config.to_filepath(args.config)
+    _write_config(fs_config, args.config)
 
 
-async def _init_server(args):
-    fs_config = MarmotConfig()
-    if args.config.is_file():
-        fs_config = MarmotConfig.from_filepath(args.config)
+def _init_server(args):
+    from .helper.config import (
+        MarmotConfig,
+        MarmotRedisConfig,
+        MarmotServerConfig,
+        DEFAULT_REDIS_URL,
+        DEFAULT_REDIS_MAXCONN,
+        DEFAULT_REDIS_TRIMFREQ,
+        DEFAULT_REDIS_STREAM_MAXLEN,
+        DEFAULT_REDIS_MAXLISTENERS,
+        DEFAULT_MARMOT_HOST,
+        DEFAULT_MARMOT_PORT,
+    )
+
+    fs_config = MarmotConfig.from_filepath_or_empty(args.config)
     if fs_config.server:
         LOGGER.warning(
             "server already initialized, server initialization canceled."
         )
         return
     fs_config.server = MarmotServerConfig(
-        host=(
-            DEFAULT_MARMOT_HOST
-            if args.use_defaults
-            else Prompt.ask(
-                "please enter marmot host", default=DEFAULT_MARMOT_HOST
-            )
-        ),
+        host=_ask(args, "please enter marmot host", DEFAULT_MARMOT_HOST),
         port=int(
-            DEFAULT_MARMOT_PORT
-            if args.use_defaults
-            else Prompt.ask(
-                "please enter marmot port", default=str(DEFAULT_MARMOT_PORT)
-            )
+            _ask(args, "please enter marmot port", str(DEFAULT_MARMOT_PORT))
         ),
         redis=MarmotRedisConfig(
-            url=(
-                DEFAULT_REDIS_URL
-                if args.use_defaults
-                else Prompt.ask(
-                    "please enter redis url", default=DEFAULT_REDIS_URL
-                )
-            ),
+            url=_ask(args, "please enter redis url", DEFAULT_REDIS_URL),
             trim_freq=int(
-                DEFAULT_REDIS_TRIMFREQ
-                if args.use_defaults
-                else Prompt.ask(
+                _ask(
+                    args,
                     "please enter redis trim frequency",
-                    default=str(DEFAULT_REDIS_TRIMFREQ),
+                    str(DEFAULT_REDIS_TRIMFREQ),
                 )
             ),
             max_connections=int(
-                DEFAULT_REDIS_MAXCONN
-                if args.use_defaults
-                else Prompt.ask(
+                _ask(
+                    args,
                     "please enter redis max connections",
-                    default=str(DEFAULT_REDIS_MAXCONN),
+                    str(DEFAULT_REDIS_MAXCONN),
+                )
+            ),
+            stream_maxlen=int(
+                _ask(
+                    args,
+                    "please enter redis stream max length",
+                    str(DEFAULT_REDIS_STREAM_MAXLEN),
+                )
+            ),
+            max_listeners=int(
+                _ask(
+                    args,
+                    "please enter redis max listeners",
+                    str(DEFAULT_REDIS_MAXLISTENERS),
                 )
             ),
         ),
         clients={},
         channels={},
     )
-    fs_config.to_filepath(args.config)
+    _write_config(fs_config, args.config)
 
 
-async def _show_client(args):
+def _show_client(args):
+    from rich.box import ROUNDED
+    from rich.table import Table
+    from .helper.crypto import dump_marmot_public_key
+
     SECRET_PROVIDER.select(args.secret_provider)
     fs_config = _load_client_config(args.config)
     pubkey = fs_config.client.prikey.public_key()
@@ -196,14 +227,61 @@ async def _show_client(args):
     table.add_row("url", str(fs_config.client.url))
     table.add_row("capath", str(fs_config.client.capath))
     table.add_row("pubkey", dump_marmot_public_key(pubkey))
-    CONSOLE.print(table)
+    _console().print(table)
+
+
+def _dump_clients(server) -> t.Dict[str, str]:
+    # public key serialization is done once per client and per command
+    from .helper.crypto import dump_marmot_public_key
+
+    return {
+        guid: dump_marmot_public_key(pubkey)
+        for guid, pubkey in server.clients.items()
+    }
+
+
+def _server_rows(server):
+    yield 'host', server.host
+    yield 'port', server.port
+    yield 'redis.url', _redact_redis_url(server.redis.url)
+    yield 'redis.trim_freq', server.redis.trim_freq
+    yield 'redis.max_connections', server.redis.max_connections
+    yield 'redis.stream_maxlen', server.redis.stream_maxlen
+    yield 'redis.max_listeners', server.redis.max_listeners
+    for guid, pubkey in _dump_clients(server).items():
+        yield 'client', guid, pubkey
+    for name in sorted(server.channels.keys()):
+        channel = server.channels[name]
+        yield 'channel', name
+        for listener in channel.listeners:
+            yield 'listener', name, listener
+        for whistler in channel.whistlers:
+            yield 'whistler', name, whistler
+
+
+def _output_format(args) -> str:
+    if args.format:
+        return args.format
+    return 'rich' if _console().is_terminal else 'plain'
+
+
+def _write_rows(rows, output_format: str):
+    # rows are written as they are produced, nothing is buffered
+    if output_format == 'csv':
+        from csv import writer
+
+        writer(sys.stdout).writerows(rows)
+        return
+    for row in rows:
+        print('\t'.join(str(item) for item in row))
 
 
-async def _show_server(args):
-    fs_config = _load_server_config(args.config)
-    if args.json:
-        print(dumps(fs_config.server.to_dict()))
-        return
+def _render_server(server):
+    from rich.box import ROUNDED
+    from rich.tree import Tree
+    from rich.panel import Panel
+    from rich.table import Table, Column
+
     table = Table(
         "Property",
         "Value",
@@ -211,210 +289,544 @@ async def _show_server(args):
         box=ROUNDED,
         expand=True,
     )
-    table.add_row("host", fs_config.server.host)
-    table.add_row("port", str(fs_config.server.port))
-    table.add_row("redis.url", _redact_redis_url(fs_config.server.redis.url))
-    table.add_row("redis.trim_freq", str(fs_config.server.redis.trim_freq))
-    table.add_row(
-        "redis.max_connections", str(fs_config.server.redis.max_connections)
-    )
-    CONSOLE.print(table)
+    table.add_row("host", server.host)
+    table.add_row("port", str(server.port))
+    table.add_row("redis.url", _redact_redis_url(server.redis.url))
+    table.add_row("redis.trim_freq", str(server.redis.trim_freq))
+    table.add_row("redis.max_connections", str(server.redis.max_connections))
+    table.add_row("redis.stream_maxlen", str(server.redis.stream_maxlen))
+    table.add_row("redis.max_listeners", str(server.redis.max_listeners))
+    _console().print(table)
     table = Table(
-        "GUID",
+        Column("GUID", width=GUID_WIDTH, no_wrap=True),
         "Public Key",
         title="Marmot Server Declared Clients",
         box=ROUNDED,
         expand=True,
     )
-    for fs_guid, fs_pubkey in fs_config.server.clients.items():
-        table.add_row(fs_guid, dump_marmot_public_key(fs_pubkey))
-    CONSOLE.print(table)
+    for guid, pubkey in _dump_clients(server).items():
+        table.add_row(guid, pubkey)
+    _console().print(table)
     r_node = Tree("channels")
-    for fs_name in sorted(fs_config.server.channels.keys()):
-        fs_channel = fs_config.server.channels[fs_name]
-        c_node = r_node.add(fs_name)
+    for name in sorted(server.channels.keys()):
+        channel = server.channels[name]
+        c_node = r_node.add(name)
         l_node = c_node.add("listeners")
-        for listener in fs_channel.listeners:
+        for listener in channel.listeners:
             l_node.add(listener)
         w_node = c_node.add("whistlers")
-        for whistler in fs_channel.whistlers:
+        for whistler in channel.whistlers:
             w_node.add(whistler)
-    CONSOLE.print(
+    _console().print(
         Panel(r_node, title="Marmot Server Declared Channels", box=ROUNDED)
     )
 
 
-async def _add_client(args):
+def _show_server(args):
     fs_config = _load_server_config(args.config)
-    fs_config.server.add_client(args.guid, args.pubkey)
-    fs_config.to_filepath(args.config)
+    output_format = _output_format(args)
+    if output_format == 'json':
+        print(dumps(fs_config.server.to_dict()))
+        return
+    if output_format == 'rich':
+        _render_server(fs_config.server)
+        return
+    _write_rows(_server_rows(fs_config.server), output_format)
+
+
+@contextmanager
+def _edit_server_config(config: Path):
+    from .helper.config import MarmotConfig, MarmotConfigError
+
+    # edited copy is not shared with cached configurations and is written
+    # back only if no exception was raised
+    with MarmotConfig.edit(config) as fs_config:
+        if not fs_config.server:
+            LOGGER.error("cannot find server configuration in: %s", config)
+            raise MarmotConfigError("cannot find server configuration")
+        yield fs_config.server
+
+
+def _add_client(args):
+    with _edit_server_config(args.config) as server:
+        server.add_client(args.guid, args.pubkey)
     LOGGER.info("client added: %s", args.guid)
 
 
-async def _rem_client(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.rem_client(args.guid)
-    fs_config.to_filepath(args.config)
+def _rem_client(args):
+    with _edit_server_config(args.config) as server:
+        server.rem_client(args.guid)
     LOGGER.info("client removed: %s", args.guid)
 
 
-async def _add_channel(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.add_channel(args.channel)
-    fs_config.to_filepath(args.config)
+def _add_channel(args):
+    with _edit_server_config(args.config) as server:
+        server.add_channel(args.channel)
     LOGGER.info("channel added: %s", args.channel)
 
 
-async def _rem_channel(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.rem_channel(args.channel)
-    fs_config.to_filepath(args.config)
+def _rem_channel(args):
+    with _edit_server_config(args.config) as server:
+        server.rem_channel(args.channel)
     LOGGER.info("channel removed: %s", args.channel)
 
 
-async def _add_whistler(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.add_whistler(args.channel, args.guid)
-    fs_config.to_filepath(args.config)
+def _add_whistler(args):
+    with _edit_server_config(args.config) as server:
+        server.add_whistler(args.channel, args.guid)
     LOGGER.info("whistler added: (%s, %s)", args.channel, args.guid)
 
 
-async def _rem_whistler(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.rem_whistler(args.channel, args.guid)
-    fs_config.to_filepath(args.config)
+def _rem_whistler(args):
+    with _edit_server_config(args.config) as server:
+        server.rem_whistler(args.channel, args.guid)
     LOGGER.info("whistler removed: (%s, %s)", args.channel, args.guid)
 
 
-async def _add_listener(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.add_listener(args.channel, args.guid)
-    fs_config.to_filepath(args.config)
+def _add_listener(args):
+    with _edit_server_config(args.config) as server:
+        server.add_listener(args.channel, args.guid)
     LOGGER.info("listener added: (%s, %s)", args.channel, args.guid)
 
 
-async def _rem_listener(args):
-    fs_config = _load_server_config(args.config)
-    fs_config.server.rem_listener(args.channel, args.guid)
-    fs_config.to_filepath(args.config)
+def _rem_listener(args):
+    with _edit_server_config(args.config) as server:
+        server.rem_listener(args.channel, args.guid)
     LOGGER.info("listener removed: (%s, %s)", args.channel, args.guid)
 
 
-async def _diff(args):
-    fs_config = _load_server_config(args.config)
-    backend = MarmotServerBackend(
+def _read_operations(opsfile: Path) -> str:
+    from .helper.config import MarmotConfigError
+
+    if str(opsfile) == '-':
+        return sys.stdin.read()
+    try:
+        return opsfile.read_text()
+    except OSError as exc:
+        raise MarmotConfigError(
+            f"cannot read operations file: {opsfile}"
+        ) from exc
+
+
+def _batch(args):
+    from .helper.config import MarmotConfigError
+
+    lines = _read_operations(args.opsfile).splitlines()
+    count = 0
+    # configuration is written once, after all operations were applied
+    with _edit_server_config(args.config) as server:
+        for lineno, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            operation, *arguments = line.split()
+            try:
+                server.apply(operation, *arguments)
+            except (ValueError, MarmotConfigError) as exc:
+                raise MarmotConfigError(
+                    f"{args.opsfile}:{lineno}: {exc}"
+                ) from exc
+            count += 1
+    LOGGER.info("%d operations applied.", count)
+
+
+def _get_backend(args, fs_config):
+    # backends are shared by all commands run in this process and closed by
+    # shutdown(), redis connection pools are bound to _LOOP
+    from .helper.backend import MarmotServerBackend
+
+    key = (
         args.redis_url or fs_config.server.redis.url,
         args.redis_max_connections or fs_config.server.redis.max_connections,
     )
-    try:
-        be_config = await backend.dump()
-    finally:
-        await backend.close()
+    backend = _BACKENDS.get(key)
+    if not backend:
+        backend = _BACKENDS[key] = MarmotServerBackend(*key)
+    return backend
+
+
+def _diff_members(be_members: t.Set[str], fs_members: t.Set[str], style=None):
+    # members are sets, differences avoid a membership test per member
+    for member in be_members & fs_members:
+        yield member, style
+    for member in be_members - fs_members:
+        yield member, style or DELETED_STYLE
+    for member in fs_members - be_members:
+        yield member, style or ADDED_STYLE
+
+
+def _diff_clients(be_server, fs_server):
+    be_clients = _dump_clients(be_server)
+    fs_clients = _dump_clients(fs_server)
+    for be_guid, be_pubkey in be_clients.items():
+        style = DELETED_STYLE if be_guid not in fs_clients else None
+        yield be_guid, be_pubkey, style
+    for fs_guid, fs_pubkey in fs_clients.items():
+        if fs_guid in be_clients:
+            continue
+        yield fs_guid, fs_pubkey, ADDED_STYLE
+
+
+def _diff_channels(be_server, fs_server):
+    # single sorted walk over both sides, added channels are listed in order
+    # instead of after all backend channels
+    for name in sorted(be_server.channels.keys() | fs_server.channels.keys()):
+        be_channel = be_server.channels.get(name)
+        fs_channel = fs_server.channels.get(name)
+        style = None
+        if not fs_channel:
+            style = DELETED_STYLE
+        elif not be_channel:
+            style = ADDED_STYLE
+        yield name, style, _diff_members(
+            be_channel.listeners if be_channel else set(),
+            fs_channel.listeners if fs_channel else set(),
+            style,
+        ), _diff_members(
+            be_channel.whistlers if be_channel else set(),
+            fs_channel.whistlers if fs_channel else set(),
+            style,
+        )
+
+
+def _diff_rows(be_server, fs_server):
+    markers = {ADDED_STYLE: '+', DELETED_STYLE: '-', None: ' '}
+    for guid, pubkey, style in _diff_clients(be_server, fs_server):
+        yield markers[style], 'client', guid, pubkey
+    for name, style, listeners, whistlers in _diff_channels(
+        be_server, fs_server
+    ):
+        yield markers[style], 'channel', name
+        for listener, style in listeners:
+            yield markers[style], 'listener', name, listener
+        for whistler, style in whistlers:
+            yield markers[style], 'whistler', name, whistler
+
+
+def _diff_dict(be_server, fs_server):
+    states = {ADDED_STYLE: 'added', DELETED_STYLE: 'deleted', None: None}
+    return {
+        'clients': {
+            guid: {'pubkey': pubkey, 'state': states[style]}
+            for guid, pubkey, style in _diff_clients(be_server, fs_server)
+        },
+        'channels': {
+            name: {
+                'state': states[style],
+                'listeners': {
+                    listener: states[style] for listener, style in listeners
+                },
+                'whistlers': {
+                    whistler: states[style] for whistler, style in whistlers
+                },
+            }
+            for name, style, listeners, whistlers in _diff_channels(
+                be_server, fs_server
+            )
+        },
+    }
+
+
+def _render_diff(be_server, fs_server):
+    from rich.box import ROUNDED
+    from rich.text import Text
+    from rich.tree import Tree
+    from rich.panel import Panel
+    from rich.table import Table, Column
+
     table = Table(
-        "GUID",
+        Column("GUID", width=GUID_WIDTH, no_wrap=True),
         "Public Key",
         title="Marmot Server Declared Clients",
         box=ROUNDED,
         expand=True,
     )
-    for be_guid, be_pubkey in be_config.server.clients.items():
-        style = (
-            DELETED_STYLE if be_guid not in fs_config.server.clients else None
-        )
-        table.add_row(be_guid, dump_marmot_public_key(be_pubkey), style=style)
-    for fs_guid, fs_pubkey in fs_config.server.clients.items():
-        if fs_guid in be_config.server.clients:
-            continue
-        table.add_row(
-            fs_guid, dump_marmot_public_key(fs_pubkey), style=ADDED_STYLE
-        )
-    CONSOLE.print(table)
+    for guid, pubkey, style in _diff_clients(be_server, fs_server):
+        table.add_row(guid, pubkey, style=style)
+    _console().print(table)
     r_node = Tree("channels")
-    for be_name in sorted(be_config.server.channels.keys()):
-        be_channel = be_config.server.channels[be_name]
-        fs_channel = fs_config.server.channels.get(be_name)
-        channel_style = DELETED_STYLE if not fs_channel else None
-        c_node = r_node.add(Text(be_name, style=channel_style))
+    for name, style, listeners, whistlers in _diff_channels(
+        be_server, fs_server
+    ):
+        c_node = r_node.add(Text(name, style=style))
         l_node = c_node.add("listeners")
-        for listener in be_channel.listeners:
-            style = channel_style or (
-                DELETED_STYLE if listener not in fs_channel.listeners else None
-            )
+        for listener, style in listeners:
             l_node.add(Text(listener, style=style))
-        if fs_channel:
-            for listener in fs_channel.listeners:
-                if listener not in be_channel.listeners:
-                    l_node.add(Text(listener, style=ADDED_STYLE))
         w_node = c_node.add("whistlers")
-        for whistler in be_channel.whistlers:
-            style = channel_style or (
-                DELETED_STYLE if whistler not in fs_channel.whistlers else None
-            )
+        for whistler, style in whistlers:
             w_node.add(Text(whistler, style=style))
-        if fs_channel:
-            for whistler in fs_channel.whistlers:
-                if whistler not in be_channel.whistlers:
-                    w_node.add(Text(whistler, style=ADDED_STYLE))
-    for fs_name in sorted(fs_config.server.channels.keys()):
-        fs_channel = fs_config.server.channels[fs_name]
-        if fs_name in be_config.server.channels:
-            continue
-        c_node = r_node.add(Text(fs_name, style=ADDED_STYLE))
-        l_node = c_node.add("listeners")
-        for listener in fs_channel.listeners:
-            l_node.add(Text(listener, style=ADDED_STYLE))
-        w_node = c_node.add("whistlers")
-        for whistler in fs_channel.whistlers:
-            w_node.add(Text(whistler, style=ADDED_STYLE))
-    CONSOLE.print(
+    _console().print(
         Panel(r_node, title="Marmot Server Declared Channels", box=ROUNDED)
     )
 
 
-async def _push(args):
+async def _diff(args, backend=None):
+    fs_config = await to_thread(_load_server_config, args.config)
+    backend = backend or _get_backend(args, fs_config)
+    be_config = await backend.dump()
+    output_format = _output_format(args)
+    if output_format == 'json':
+        print(dumps(_diff_dict(be_config.server, fs_config.server)))
+        return
+    if output_format == 'rich':
+        _render_diff(be_config.server, fs_config.server)
+        return
+    _write_rows(_diff_rows(be_config.server, fs_config.server), output_format)
+
+
+async def _push(args, backend=None):
+    from rich.prompt import Confirm
+
     LOGGER.warning(
         "[red]!!! BACKEND CONFIG WILL BE REPLACED !!![/]",
         extra={'markup': True},
     )
     if not Confirm.ask("do you want to push config from fs to backend?"):
         return
-    fs_config = _load_server_config(args.config)
-    backend = MarmotServerBackend(
-        args.redis_url or fs_config.server.redis.url,
-        args.redis_max_connections or fs_config.server.redis.max_connections,
-    )
+    fs_config = await to_thread(_load_server_config, args.config)
     LOGGER.info("pushing config to backend...")
-    try:
-        await backend.load(fs_config)
-    finally:
-        await backend.close()
+    backend = backend or _get_backend(args, fs_config)
+    await backend.load(fs_config)
     LOGGER.info("push is complete.")
 
 
-async def _pull(args):
+async def _pull(args, backend=None):
+    from rich.prompt import Confirm
+
     LOGGER.warning(
         "[red]!!! FILESYSTEM CONFIG WILL BE REPLACED !!![/]",
         extra={'markup': True},
     )
     if not Confirm.ask("do you want to pull config from backend to fs?"):
         return
-    fs_config = _load_server_config(args.config)
-    backend = MarmotServerBackend(
-        args.redis_url or fs_config.server.redis.url,
-        args.redis_max_connections or fs_config.server.redis.max_connections,
-    )
+    fs_config = await to_thread(_load_server_config, args.config)
     LOGGER.info("pulling config from backend...")
-    try:
-        be_config = await backend.dump()
-    finally:
-        await backend.close()
+    backend = backend or _get_backend(args, fs_config)
+    be_config = await backend.dump()
     fs_config.server.clients = be_config.server.clients
     fs_config.server.channels = be_config.server.channels
-    fs_config.to_filepath(args.config)
+    await to_thread(_write_config, fs_config, args.config)
     LOGGER.info("pull is complete.")
 
 
-def _parse_args():
+async def _shell(args):
+    from shlex import split
+    from functools import partial
+    from inspect import iscoroutinefunction
+    from redis.exceptions import RedisError
+    from .helper.config import MarmotConfigError
+
+    fs_config = await to_thread(_load_server_config, args.config)
+    backend = _get_backend(args, fs_config)
+    LOGGER.info("type a command with its arguments, 'exit' to quit.")
+    while True:
+        try:
+            line = input('marmot> ').strip()
+        except EOFError:
+            print()
+            break
+        if not line:
+            continue
+        if line in ('exit', 'quit'):
+            break
+        try:
+            argv = ['--config', str(args.config), *split(line)]
+        except ValueError as exc:
+            LOGGER.error("cannot parse command: %s", exc)
+            continue
+        if argv[2] == 'shell':
+            LOGGER.warning("already in shell.")
+            continue
+        try:
+            cmd_args = _parse_args(argv)
+        except SystemExit:
+            continue
+        try:
+            # backend commands reuse the connection pool of the shell
+            if iscoroutinefunction(cmd_args.func):
+                await partial(cmd_args.func, backend=backend)(cmd_args)
+            else:
+                cmd_args.func(cmd_args)
+        except MarmotConfigError as exc:
+            LOGGER.error("marmot configuration error: %s", exc)
+        except RedisError as exc:
+            # backend might be back for the next command, keep the shell
+            LOGGER.error("marmot backend error: %s", exc)
+
+
+USE_DEFAULTS_ARGUMENT = (
+    ('--use-defaults',),
+    {
+        'action': 'store_true',
+        'help': "use default values, non-interactive mode",
+    },
+)
+FORMAT_ARGUMENT = (
+    ('--format',),
+    {
+        'choices': OUTPUT_FORMATS,
+        'help': "output format, rich on a terminal and plain otherwise",
+    },
+)
+REDIS_ARGUMENTS = (
+    (
+        ('--redis-url',),
+        {'help': "marmot redis url, do not add credentials in this url"},
+    ),
+    (
+        ('--redis-max-connections',),
+        {'type': int, 'help': "marmot redis max connections"},
+    ),
+)
+# subcommand name -> (handler, help, arguments)
+COMMANDS = {
+    'init-client': (
+        _init_client,
+        "initialize client configuration",
+        (USE_DEFAULTS_ARGUMENT,),
+    ),
+    'init-server': (
+        _init_server,
+        "initialize server configuration",
+        (USE_DEFAULTS_ARGUMENT,),
+    ),
+    'show-client': (
+        _show_client,
+        "show client configuration",
+        (
+            (('--json',), {'action': 'store_true', 'help': "JSON output"}),
+            (
+                ('--secret-provider', '--sp'),
+                {
+                    'type': SecretProviderBackend,
+                    'default': SecretProviderBackend.GETPASS,
+                    'help': (
+                        "marmot secret provider, one of "
+                        f"{{{','.join(SECRET_PROVIDERS)}}}"
+                    ),
+                },
+            ),
+        ),
+    ),
+    'show-server': (
+        _show_server,
+        "show server configuration",
+        (
+            (
+                ('--json',),
+                {
+                    'action': 'store_const',
+                    'const': 'json',
+                    'dest': 'format',
+                    'help': "JSON output, same as --format json",
+                },
+            ),
+            FORMAT_ARGUMENT,
+        ),
+    ),
+    'add-client': (
+        _add_client,
+        "add a client",
+        (
+            (('guid',), {'help': "guid of the client to add"}),
+            (('pubkey',), {'help': "public key of the client to add"}),
+        ),
+    ),
+    'rem-client': (
+        _rem_client,
+        "remove a client",
+        ((('guid',), {'help': "guid of the client to remove"}),),
+    ),
+    'add-channel': (
+        _add_channel,
+        "add a channel",
+        ((('channel',), {'help': "channel to add"}),),
+    ),
+    'rem-channel': (
+        _rem_channel,
+        "remove a channel",
+        ((('channel',), {'help': "channel to remove"}),),
+    ),
+    'add-whistler': (
+        _add_whistler,
+        "add a whistler to a channel",
+        (
+            (('channel',), {'help': "channel to update"}),
+            (('guid',), {'help': "guid of the whistler to add"}),
+        ),
+    ),
+    'rem-whistler': (
+        _rem_whistler,
+        "remove a whistler from a channel",
+        (
+            (('channel',), {'help': "channel to update"}),
+            (('guid',), {'help': "guid of the whistler to remove"}),
+        ),
+    ),
+    'add-listener': (
+        _add_listener,
+        "add a listener to a channel",
+        (
+            (('channel',), {'help': "channel to update"}),
+            (('guid',), {'help': "guid of the listener to add"}),
+        ),
+    ),
+    'rem-listener': (
+        _rem_listener,
+        "remove a listener from a channel",
+        (
+            (('channel',), {'help': "channel to update"}),
+            (('guid',), {'help': "guid of the listener to remove"}),
+        ),
+    ),
+    'batch': (
+        _batch,
+        "apply add-*/rem-* operations listed in a file at once",
+        (
+            (
+                ('opsfile',),
+                {
+                    'type': Path,
+                    'help': (
+                        "file containing one operation per line, e.g. "
+                        "add-channel ops, - reads operations from stdin"
+                    ),
+                },
+            ),
+        ),
+    ),
+    'diff': (
+        _diff,
+        "show what will happen when fs config is pushed to backend",
+        (*REDIS_ARGUMENTS, FORMAT_ARGUMENT),
+    ),
+    'push': (_push, "push fs config to backend", REDIS_ARGUMENTS),
+    'pull': (_pull, "pull backend config to fs", REDIS_ARGUMENTS),
+    'shell': (
+        _shell,
+        "run commands interactively sharing one backend connection pool",
+        REDIS_ARGUMENTS,
+    ),
+}
+
+
+def _sniff_command(argv: t.List[str]) -> t.Optional[str]:
+    """Find subcommand name or help/version flag in argv"""
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in ('--config', '-c'):
+            skip = True
+            continue
+        if arg in ('--help', '-h', '--version') or not arg.startswith('-'):
+            return arg
+    return None
+
+
+@lru_cache(maxsize=None)
+def _build_parser(command: t.Optional[str]) -> ArgumentParser:
     parser = ArgumentParser(description=BANNER)
     parser.add_argument(
         '--config',
@@ -423,130 +835,76 @@ def _parse_args():
         default=Path('marmot.json'),
         help="marmot configuration file",
     )
+    parser.add_argument('--version', action='version', version=version)
     cmd = parser.add_subparsers(dest='cmd')
     cmd.required = True
-    init_client = cmd.add_parser(
-        'init-client', help="initialize client configuration"
-    )
-    init_client.add_argument(
-        '--use-defaults',
-        action='store_true',
-        help="use default values, non-interactive mode",
-    )
-    init_client.set_defaults(async_func=_init_client)
-    init_server = cmd.add_parser(
-        'init-server', help="initialize server configuration"
-    )
-    init_server.add_argument(
-        '--use-defaults',
-        action='store_true',
-        help="use default values, non-interactive mode",
-    )
-    init_server.set_defaults(async_func=_init_server)
-    show_client = cmd.add_parser(
-        'show-client', help="show client configuration"
-    )
-    show_client.add_argument('--json', action='store_true', help="JSON output")
-    show_client.add_argument(
-        '--secret-provider',
-        '--sp',
-        type=SecretProviderBackend,
-        default=SecretProviderBackend.GETPASS,
-        help=f"marmot secret provider, one of {{{','.join(SECRET_PROVIDERS)}}}",
-    )
-    show_client.set_defaults(async_func=_show_client)
-    show_server = cmd.add_parser(
-        'show-server', help="show server configuration"
-    )
-    show_server.add_argument('--json', action='store_true', help="JSON output")
-    show_server.set_defaults(async_func=_show_server)
-    add_client = cmd.add_parser('add-client', help="add a client")
-    add_client.add_argument('guid', help="guid of the client to add")
-    add_client.add_argument('pubkey', help="public key of the client to add")
-    add_client.set_defaults(async_func=_add_client)
-    rem_client = cmd.add_parser('rem-client', help="remove a client")
-    rem_client.add_argument('guid', help="guid of the client to remove")
-    rem_client.set_defaults(async_func=_rem_client)
-    add_channel = cmd.add_parser('add-channel', help="add a channel")
-    add_channel.add_argument('channel', help="channel to add")
-    add_channel.set_defaults(async_func=_add_channel)
-    rem_channel = cmd.add_parser('rem-channel', help="remove a channel")
-    rem_channel.add_argument('channel', help="channel to remove")
-    rem_channel.set_defaults(async_func=_rem_channel)
-    add_whistler = cmd.add_parser(
-        'add-whistler', help="add a whistler to a channel"
-    )
-    add_whistler.add_argument('channel', help="channel to update")
-    add_whistler.add_argument('guid', help="guid of the whistler to add")
-    add_whistler.set_defaults(async_func=_add_whistler)
-    rem_whistler = cmd.add_parser(
-        'rem-whistler', help="remove a whistler from a channel"
-    )
-    rem_whistler.add_argument('channel', help="channel to update")
-    rem_whistler.add_argument('guid', help="guid of the whistler to remove")
-    rem_whistler.set_defaults(async_func=_rem_whistler)
-    add_listener = cmd.add_parser(
-        'add-listener', help="add a listener to a channel"
-    )
-    add_listener.add_argument('channel', help="channel to update")
-    add_listener.add_argument('guid', help="guid of the listener to add")
-    add_listener.set_defaults(async_func=_add_listener)
-    rem_listener = cmd.add_parser(
-        'rem-listener', help="remove a listener from a channel"
-    )
-    rem_listener.add_argument('channel', help="channel to update")
-    rem_listener.add_argument('guid', help="guid of the listener to remove")
-    rem_listener.set_defaults(async_func=_rem_listener)
-    diff = cmd.add_parser(
-        'diff',
-        help="show what will happen when fs config is pushed to backend",
-    )
-    diff.add_argument(
-        '--redis-url',
-        help="marmot redis url, do not add credentials in this url",
-    )
-    diff.add_argument(
-        '--redis-max-connections',
-        type=int,
-        help="marmot redis max connections",
-    )
-    diff.set_defaults(async_func=_diff)
-    push = cmd.add_parser('push', help="push fs config to backend")
-    push.add_argument(
-        '--redis-url',
-        help="marmot redis url, do not add credentials in this url",
-    )
-    push.add_argument(
-        '--redis-max-connections',
-        type=int,
-        help="marmot redis max connections",
-    )
-    push.set_defaults(async_func=_push)
-    pull = cmd.add_parser('pull', help="pull backend config to fs")
-    pull.add_argument(
-        '--redis-url',
-        help="marmot redis url, do not add credentials in this url",
-    )
-    pull.add_argument(
-        '--redis-max-connections',
-        type=int,
-        help="marmot redis max connections",
-    )
-    pull.set_defaults(async_func=_pull)
-    return parser.parse_args()
+    # only build the parser of the requested subcommand, help or unknown
+    # subcommand needs all of them to enumerate available subcommands
+    for name in (command,) if command else COMMANDS:
+        func, help_, arguments = COMMANDS[name]
+        subparser = cmd.add_parser(name, help=help_)
+        for flags, kwargs in arguments:
+            subparser.add_argument(*flags, **kwargs)
+        subparser.set_defaults(func=func)
+    return parser
+
+
+def _parse_args(argv: t.Optional[t.List[str]] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    sniffed = _sniff_command(argv)
+    if sniffed == '--version':
+        print(version)
+        sys.exit(0)
+    # parsers are cached, shell reuses them for every line
+    command = sniffed if sniffed in COMMANDS else None
+    return _build_parser(command).parse_args(argv)
+
+
+def _run(coro):
+    global _LOOP
+    if _LOOP is None:
+        from .helper.loop import new_marmot_loop
+
+        _LOOP = new_marmot_loop()
+    return _LOOP.run_until_complete(coro)
+
+
+def shutdown():
+    """Close backends shared by commands and their event loop"""
+    global _LOOP
+    if _LOOP is None:
+        return
+    for backend in _BACKENDS.values():
+        _LOOP.run_until_complete(backend.close())
+    _BACKENDS.clear()
+    _LOOP.close()
+    _LOOP = None
 
 
-def app():
-    """Aplication entrypoint"""
-    LOGGER.info(BANNER, extra={'highlighter': None})
-    args = _parse_args()
-    loop = new_event_loop()
+def main(argv: t.Optional[t.List[str]] = None):
+    """Run a marmot-config command, argv defaults to sys.argv[1:]"""
+    args = _parse_args(argv)
+    from inspect import iscoroutinefunction
+    from .helper.config import MarmotConfigError
+
     try:
-        loop.run_until_complete(args.async_func(args))
+        # only backend commands need an event loop
+        if iscoroutinefunction(args.func):
+            _run(args.func(args))
+        else:
+            args.func(args)
     except MarmotConfigError as exc:
         LOGGER.error("marmot configuration error: %s", exc)
     except KeyboardInterrupt:
         print()
         LOGGER.warning("operation canceled.")
+
+
+def app():
+    """Aplication entrypoint"""
+    LOGGER.info(BANNER, extra={'highlighter': None})
+    try:
+        main()
     finally:
-        loop.close()
+        shutdown()
@@ -1,12 +1,14 @@
 """Marmot API helpers
 """
+import typing as t
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from .crypto import (
     MarmotPublicKey,
     MarmotPrivateKey,
     hash_marmot_data,
     sign_marmot_data_digest,
+    sign_marmot_data_digests,
     verify_marmot_data_digest,
 )
 
@@ -20,11 +22,20 @@ class MarmotMessageLevel(Enum):
     INFO = 'INFO'
     DEBUG = 'DEBUG'
 
+    def __init__(self, value: str):
+        # encoded once, used when computing message digests
+        self.bvalue = value.encode()
+
 
 MARMOT_MESSAGE_LEVELS = [lvl.value for lvl in MarmotMessageLevel]
+# plain dict lookup is cheaper than calling the enum class
+LEVEL_BY_VALUE = {lvl.value: lvl for lvl in MarmotMessageLevel}
+
+
+DIGEST_FIELDS = frozenset({'channel', 'content', 'level'})
 
 
-@dataclass
+@dataclass(slots=True)
 class MarmotAPIMessage:
     """Marmot API message"""
 
@@ -33,12 +44,29 @@ class MarmotAPIMessage:
     whistler: str = ""
     signature: str = ""
     level: MarmotMessageLevel = MarmotMessageLevel.INFO
+    _digest: t.Optional[bytes] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name, value):
+        # zero-argument super() is not available in slots dataclasses
+        object.__setattr__(self, name, value)
+        if name in DIGEST_FIELDS:
+            object.__setattr__(self, '_digest', None)
 
     @property
     def digest(self):
         """Message digest"""
-        message_data = ':'.join([self.channel, self.level.value, self.content])
-        return hash_marmot_data(message_data.encode())
+        if self._digest is None:
+            message_data = b':'.join(
+                (
+                    self.channel.encode(),
+                    self.level.bvalue,
+                    self.content.encode(),
+                )
+            )
+            self._digest = hash_marmot_data(message_data)
+        return self._digest
 
     @classmethod
     def from_dict(cls, dct):
@@ -47,7 +75,7 @@ class MarmotAPIMessage:
             channel=dct['channel'],
             content=dct['content'],
             whistler=dct['whistler'],
-            level=MarmotMessageLevel(dct['level']),
+            level=LEVEL_BY_VALUE[dct['level']],
             signature=dct['signature'],
         )
 
@@ -66,6 +94,18 @@ class MarmotAPIMessage:
         self.signature = sign_marmot_data_digest(prikey, self.digest)
         return self
 
+    @staticmethod
+    def sign_many(
+        messages: t.List['MarmotAPIMessage'], prikey: MarmotPrivateKey
+    ) -> t.List['MarmotAPIMessage']:
+        """Update signature of several messages using the same private key"""
+        signatures = sign_marmot_data_digests(
+            prikey, [message.digest for message in messages]
+        )
+        for message, signature in zip(messages, signatures):
+            message.signature = signature
+        return messages
+
     def verify(self, pubkey: MarmotPublicKey):
         """Verify message signature"""
         return verify_marmot_data_digest(pubkey, self.digest, self.signature)
@@ -1,9 +1,16 @@
 """Marmot notification module
 """
 import typing as t
-from redis.asyncio import Redis
+from time import monotonic
+from asyncio import Semaphore, gather, create_task
+from functools import lru_cache
+from collections import Counter
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.exceptions import RedisError
 from .api import MarmotAPIMessage
 from .config import (
+    DEFAULT_REDIS_STREAM_MAXLEN,
+    DEFAULT_REDIS_MAXLISTENERS,
     MarmotConfig,
     MarmotRedisConfig,
     MarmotServerConfig,
@@ -16,90 +23,242 @@ from .crypto import (
     hash_marmot_listen_params,
     verify_marmot_data_digest,
 )
+from .json import dumps
 from .logging import LOGGER
 
 
 KEY_MARMOT_CLIENTS = 'marmot::clients'
 KEY_MARMOT_CHANNELS = 'marmot::channels'
+TRIM_CONCURRENCY = 32
+# channels receiving messages are trimmed every TRIM_PUSH_INTERVAL pushes, the
+# periodic trim only has to catch up with idle channels
+TRIM_PUSH_INTERVAL = 128
+# authorization state is cached for a short time only, changes pushed to redis
+# by another process are honored once entries expire
+AUTHZ_CACHE_TTL = 5.0
+AUTHZ_CACHE_MAXSIZE = 4096
+# seconds to wait for a free connection before giving up
+REDIS_POOL_TIMEOUT = 20
+# pull waits server-side for new messages instead of polling, wait at most
+# PULL_BLOCK_MS so that the caller can check its state regularly
+PULL_BLOCK_MS = 5000
+PULL_COUNT = 100
+# add listener positioned after the last message of the channel stream unless
+# it is already a listener, in a single round trip
+ADD_LISTENER_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+local info = redis.call('XINFO', 'STREAM', KEYS[2])
+for index = 1, #info, 2 do
+    if info[index] == 'last-generated-id' then
+        redis.call('HSET', KEYS[1], ARGV[1], info[index + 1])
+        return 1
+    end
+end
+return 0
+"""
+
+
+@lru_cache(maxsize=4096)
+def _verify_client_signature(
+    b64_der_data: str, digest: bytes, signature: str
+) -> bool:
+    # verification is deterministic, retried requests skip the costly part
+    pubkey = load_marmot_public_key(b64_der_data)
+    return verify_marmot_data_digest(pubkey, digest, signature)
 
 
+def _stream_id_key(message_id: str) -> t.Tuple[int, int]:
+    # stream ids are '<ms>-<seq>' strings, they do not sort lexicographically
+    milliseconds, _, sequence = message_id.partition('-')
+    return int(milliseconds), int(sequence or 0)
+
+
+@lru_cache(maxsize=4096)
 def _marmot_channel_stream(channel):
     return f'marmot::{channel}::stream'
 
 
+@lru_cache(maxsize=4096)
 def _marmot_channel_listeners(channel):
     return f'marmot::{channel}::listeners'
 
 
+@lru_cache(maxsize=4096)
 def _marmot_channel_whistlers(channel):
     return f'marmot::{channel}::whistlers'
 
 
+def _stream_entry(message: MarmotAPIMessage) -> t.Mapping[str, str]:
+    # serialized once when published instead of once per listener
+    return {'payload': dumps(message.to_dict())}
+
+
+def _stream_payload(fields: t.Mapping[str, str]) -> str:
+    payload = fields.get('payload')
+    if payload is None:
+        # message pushed before payloads were stored serialized
+        payload = dumps(MarmotAPIMessage.from_dict(fields).to_dict())
+    return payload
+
+
 class MarmotServerBackend:
     """Marmot server backend"""
 
-    def __init__(self, url: str, max_connections: int):
+    def __init__(
+        self,
+        url: str,
+        max_connections: int,
+        stream_maxlen: int = DEFAULT_REDIS_STREAM_MAXLEN,
+        max_listeners: int = DEFAULT_REDIS_MAXLISTENERS,
+    ):
         self._url = url
         self._max_connections = max_connections
-        self._redis = Redis.from_url(
+        self._stream_maxlen = stream_maxlen
+        self._max_listeners = max(max_listeners, 1)
+        self._listeners = 0
+        # callers wait for a connection to be released when the pool is
+        # exhausted instead of failing with a "too many connections" error
+        pool_size = min(max(max_connections, 10), 2 ** 15)
+        pool = BlockingConnectionPool.from_url(
             url,
             encoding='utf-8',
-            max_connections=min(max(max_connections, 10), 2 ** 15),
+            max_connections=pool_size,
+            timeout=REDIS_POOL_TIMEOUT,
             decode_responses=True,
         )
+        self._redis = Redis(connection_pool=pool)
+        # blocking pulls hold a connection for up to PULL_BLOCK_MS, they use
+        # a separate pool with one connection per admitted listener so that
+        # listeners never wait for each other nor starve whistles, acks and
+        # authorization lookups
+        pull_pool = BlockingConnectionPool.from_url(
+            url,
+            encoding='utf-8',
+            max_connections=self._max_listeners,
+            timeout=REDIS_POOL_TIMEOUT,
+            decode_responses=True,
+        )
+        self._pull_redis = Redis(connection_pool=pull_pool)
+        self._add_listener_script = self._redis.register_script(
+            ADD_LISTENER_SCRIPT
+        )
+        self._authz_cache: t.Dict[
+            t.Tuple[str, str, str], t.Tuple[float, str]
+        ] = {}
+        self._push_counts = Counter()
+        self._trim_tasks = {}
 
     async def close(self):
         """Close underlying redis connections"""
-        await self._redis.close()
-        # building Redis instance using from_url implies that we need to close
-        # the underlying connection_pool explicitly
-        await self._redis.connection_pool.disconnect()
+        for task in list(self._trim_tasks.values()):
+            task.cancel()
+        await gather(*self._trim_tasks.values(), return_exceptions=True)
+        # Redis instances do not own the connection pool they were given,
+        # pools need to be closed explicitly
+        for redis in (self._redis, self._pull_redis):
+            await redis.close()
+            await redis.connection_pool.disconnect()
+
+    def acquire_listener(self) -> bool:
+        """Admit a listener unless max listeners is reached"""
+        if self._listeners >= self._max_listeners:
+            return False
+        self._listeners += 1
+        return True
+
+    def release_listener(self):
+        """Release a listener admitted by acquire_listener"""
+        self._listeners -= 1
 
     async def add_client(self, guid: str, pubkey: MarmotPublicKey):
         """Add or update a client"""
+        self._authz_cache.clear()
         await self._redis.hset(
             KEY_MARMOT_CLIENTS, guid, dump_marmot_public_key(pubkey)
         )
 
     async def rem_client(self, guid: str):
         """Delete a client"""
-        # remove client from the list
-        await self._redis.hdel(KEY_MARMOT_CLIENTS, guid)
-        # iterate channels to remove client from listeners
-        async for key in self._redis.scan_iter(_marmot_channel_listeners('*')):
-            await self._redis.hdel(key, guid)
-        # iterate channels to remove client from whistlers
-        async for key in self._redis.scan_iter(_marmot_channel_whistlers('*')):
-            await self._redis.srem(key, guid)
+        self._authz_cache.clear()
+        # registered channels are the only ones holding listeners and
+        # whistlers structures, no need to scan the whole keyspace
+        channels = await self._redis.smembers(KEY_MARMOT_CHANNELS)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            # remove client from the list
+            pipe.hdel(KEY_MARMOT_CLIENTS, guid)
+            # remove client from listeners and whistlers of each channel
+            for channel in channels:
+                pipe.hdel(_marmot_channel_listeners(channel), guid)
+                pipe.srem(_marmot_channel_whistlers(channel), guid)
+            await pipe.execute()
 
-    async def add_channel(self, name: str, channel: MarmotChannelConfig):
-        """Add or update a channel"""
-        # ensure channel stream exists
-        key = _marmot_channel_stream(name)
-        count = await self._redis.exists(key)
+    @staticmethod
+    def _queue_channel_state(pipe, name: str):
+        # queue the reads needed by _queue_channel_update
+        pipe.exists(_marmot_channel_stream(name))
+        pipe.smembers(_marmot_channel_whistlers(name))
+        pipe.hkeys(_marmot_channel_listeners(name))
+
+    async def _queue_channel_update(
+        self, pipe, name: str, channel: MarmotChannelConfig, state: t.List
+    ):
+        # queue the writes bringing channel state in line with configuration
+        stream_key = _marmot_channel_stream(name)
+        whistlers_key = _marmot_channel_whistlers(name)
+        listeners_key = _marmot_channel_listeners(name)
+        count, whistlers, listeners = state
+        whistlers = set(whistlers)
+        listeners = set(listeners)
+        new_listeners = set(channel.listeners).difference(listeners)
+        # ensure channel stream exists, new listeners start after its last
+        # message
+        last_message_id = None
         if count == 0:
-            await self._redis.xadd(key, MarmotAPIMessage().to_dict())
+            last_message_id = await self._redis.xadd(
+                stream_key, MarmotAPIMessage().to_dict()
+            )
+        elif new_listeners:
+            info = await self._redis.xinfo_stream(stream_key)
+            last_message_id = info['last-generated-id']
         # remove whistlers if necessary
-        key = _marmot_channel_whistlers(name)
-        whistlers = set(await self._redis.smembers(key))
-        for whistler in whistlers.difference(channel.whistlers):
-            await self.rem_whistler(name, whistler)
+        old_whistlers = whistlers.difference(channel.whistlers)
+        if old_whistlers:
+            pipe.srem(whistlers_key, *old_whistlers)
         # add whistlers if necessary
-        for whistler in channel.whistlers:
-            await self.add_whistler(name, whistler)
-        key = _marmot_channel_listeners(name)
+        if channel.whistlers:
+            pipe.sadd(whistlers_key, *channel.whistlers)
         # remove listeners if necessary
-        listeners = set(await self._redis.hkeys(key))
-        for listener in listeners.difference(channel.listeners):
-            await self.rem_listener(name, listener)
-        # add listeners if necessary
-        for listener in channel.listeners:
-            await self.add_listener(name, listener)
+        old_listeners = listeners.difference(channel.listeners)
+        if old_listeners:
+            pipe.hdel(listeners_key, *old_listeners)
+        # add listeners if necessary, existing ones keep their position
+        if new_listeners:
+            pipe.hset(
+                listeners_key,
+                mapping={
+                    listener: last_message_id for listener in new_listeners
+                },
+            )
         # ensure channel is registered
-        await self._redis.sadd(KEY_MARMOT_CHANNELS, name)
+        pipe.sadd(KEY_MARMOT_CHANNELS, name)
+
+    async def add_channel(self, name: str, channel: MarmotChannelConfig):
+        """Add or update a channel"""
+        self._authz_cache.clear()
+        # fetch current channel state in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            self._queue_channel_state(pipe, name)
+            state = await pipe.execute()
+        # apply all changes in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            await self._queue_channel_update(pipe, name, channel, state)
+            await pipe.execute()
 
     async def rem_channel(self, name: str):
         """Delete a channel"""
+        self._authz_cache.clear()
         # unregister channel
         await self._redis.srem(KEY_MARMOT_CHANNELS, name)
         # delete channel stream
@@ -111,17 +270,17 @@ class MarmotServerBackend:
 
     async def add_listener(self, channel: str, listener: str):
         """Add listener to channel"""
-        key = _marmot_channel_listeners(channel)
-        count = await self._redis.hexists(key, listener)
-        if count == 1:
-            return
-        stream_key = _marmot_channel_stream(channel)
-        info = await self._redis.xinfo_stream(stream_key)
-        last_message_id = info['last-generated-id']
-        await self._redis.hset(key, listener, last_message_id)
+        await self._add_listener_script(
+            keys=[
+                _marmot_channel_listeners(channel),
+                _marmot_channel_stream(channel),
+            ],
+            args=[listener],
+        )
 
     async def rem_listener(self, channel: str, listener: str):
         """Delete listener from channel"""
+        self._authz_cache.clear()
         await self._redis.hdel(_marmot_channel_listeners(channel), listener)
 
     async def add_whistler(self, channel: str, whistler: str):
@@ -130,20 +289,66 @@ class MarmotServerBackend:
 
     async def rem_whistler(self, channel: str, whistler: str):
         """Delete whistler from channel"""
+        self._authz_cache.clear()
         await self._redis.srem(_marmot_channel_whistlers(channel), whistler)
 
     async def push(self, message: MarmotAPIMessage):
         """Push a message in the stream"""
         key = _marmot_channel_stream(message.channel)
-        await self._redis.xadd(key, message.to_dict())
+        # approximate capping is nearly free, trim() still removes messages
+        # read by every listener
+        await self._redis.xadd(
+            key,
+            _stream_entry(message),
+            maxlen=self._stream_maxlen,
+            approximate=True,
+        )
+        self._count_pushes([message.channel])
+
+    async def push_many(self, messages: t.List[MarmotAPIMessage]):
+        """Push several messages in their streams at once"""
+        if not messages:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for message in messages:
+                pipe.xadd(
+                    _marmot_channel_stream(message.channel),
+                    _stream_entry(message),
+                    maxlen=self._stream_maxlen,
+                    approximate=True,
+                )
+            await pipe.execute()
+        self._count_pushes([message.channel for message in messages])
+
+    def _count_pushes(self, channels: t.List[str]):
+        push_counts = self._push_counts
+        push_counts.update(channels)
+        for channel in set(channels):
+            if push_counts[channel] < TRIM_PUSH_INTERVAL:
+                continue
+            # at most one pending trim per channel, pushes are not delayed
+            if channel in self._trim_tasks:
+                continue
+            push_counts[channel] = 0
+            task = create_task(self._trim_in_background(channel))
+            self._trim_tasks[channel] = task
+
+    async def _trim_in_background(self, channel: str):
+        try:
+            await self.trim(channel)
+        except RedisError:
+            LOGGER.exception("failed to trim channel: %s", channel)
+        finally:
+            self._trim_tasks.pop(channel, None)
 
     async def pull(
         self, channels: t.List[str], listener: str
     ) -> t.Iterator[
-        t.Union[t.Tuple[str, MarmotAPIMessage], t.Tuple[None, None]]
+        t.Tuple[t.Optional[str], t.Optional[str], t.Optional[str]]
     ]:
-        """Pull pending messages"""
+        """Pull pending messages as (message id, channel, JSON payload)"""
         states = {}
+        channel_by_key = {}
         for channel in channels:
             key = _marmot_channel_listeners(channel)
             last_message_id = await self._redis.hget(key, listener)
@@ -151,89 +356,127 @@ class MarmotServerBackend:
                 continue
             key = _marmot_channel_stream(channel)
             states[key] = last_message_id
+            channel_by_key[key] = channel
         # listener cannot read theses channels anymore
         if not states:
-            yield None, None
+            yield None, None, None
             return
-        streams = await self._redis.xread(states)
-        for _, messages in streams:
-            for message_id, message in messages:
-                yield message_id, MarmotAPIMessage.from_dict(message)
+        streams = await self._pull_redis.xread(
+            states, count=PULL_COUNT, block=PULL_BLOCK_MS
+        )
+        for key, messages in streams:
+            channel = channel_by_key[key]
+            for message_id, fields in messages:
+                yield message_id, channel, _stream_payload(fields)
 
     async def ack(self, channel: str, listener: str, message_id: str):
         """Ack that previously pulled message was processed successfully"""
         key = _marmot_channel_listeners(channel)
         await self._redis.hset(key, listener, message_id)
 
+    async def ack_many(self, listener: str, message_ids: t.Mapping[str, str]):
+        """Ack last processed message of several channels at once"""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel, message_id in message_ids.items():
+                pipe.hset(
+                    _marmot_channel_listeners(channel), listener, message_id
+                )
+            await pipe.execute()
+
     async def trim(self, channel: str):
-        """Remove delivered messages from stream"""
+        """Remove delivered messages from stream, return removed count"""
         key = _marmot_channel_listeners(channel)
         listeners = await self._redis.hgetall(key)
         key = _marmot_channel_stream(channel)
-        minid = None
-        mincount = None
-        for last_message_id in listeners.values():
-            count = len(await self._redis.xrange(key, max=last_message_id))
-            if not mincount or count < mincount:
-                minid = last_message_id
-                mincount = count
-        if minid:
+        if listeners:
+            # stream ids are ordered, the listener lagging behind is the one
+            # with the smallest last message id
+            minid = min(listeners.values(), key=_stream_id_key)
             # if listeners trim up to the oldest unread message
-            LOGGER.info("trim messages: (%s, %s)", channel, mincount)
-            await self._redis.xtrim(key, minid=minid)
+            count = await self._redis.xtrim(key, minid=minid)
+            LOGGER.info("trim messages: (%s, %s)", channel, count)
         else:
             # if no listener at all trim all messages
+            count = await self._redis.xtrim(key, maxlen=1)
             LOGGER.info("trim messages: (%s, all)", channel)
-            await self._redis.xtrim(key, maxlen=1)
-        return mincount
+        return count
 
     async def trim_all(self):
         """Call trim for each channel"""
         channels = await self._redis.smembers(KEY_MARMOT_CHANNELS)
-        for channel in channels:
-            await self.trim(channel)
+        # trim channels concurrently but bound the number of connections
+        # taken from the pool
+        semaphore = Semaphore(TRIM_CONCURRENCY)
+
+        async def _trim(channel):
+            async with semaphore:
+                return await self.trim(channel)
+
+        await gather(*(_trim(channel) for channel in channels))
 
     async def load(self, fs_config: MarmotConfig):
         """Load marmot configuration as backend state"""
+        self._authz_cache.clear()
         # retrieve backened configuration
-        be_clients = set(await self._redis.hkeys(KEY_MARMOT_CLIENTS))
-        be_channels = set(await self._redis.smembers(KEY_MARMOT_CHANNELS))
-        # compute changes
-        clients_to_rem = be_clients.difference(
-            set(fs_config.server.clients.keys())
-        )
-        channels_to_rem = be_channels.difference(
-            set(fs_config.server.channels.keys())
-        )
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hkeys(KEY_MARMOT_CLIENTS)
+            pipe.smembers(KEY_MARMOT_CHANNELS)
+            be_clients, be_channels = await pipe.execute()
+        # compute changes, smembers already returns a set and difference
+        # accepts the configuration dicts as they are
+        clients_to_rem = set(be_clients).difference(fs_config.server.clients)
+        channels_to_rem = be_channels.difference(fs_config.server.channels)
         # apply changes
         for channel_to_rem in channels_to_rem:
             await self.rem_channel(channel_to_rem)
         for client_to_rem in clients_to_rem:
             await self.rem_client(client_to_rem)
-        for guid, pubkey in fs_config.server.clients.items():
-            await self.add_client(guid, pubkey)
-        for name, channel in fs_config.server.channels.items():
-            await self.add_channel(name, channel)
+        # fetch the state of every channel in a single round trip
+        channels = list(fs_config.server.channels.items())
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for name, _ in channels:
+                self._queue_channel_state(pipe, name)
+            states = await pipe.execute()
+        # add or update clients and channels in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            if fs_config.server.clients:
+                pipe.hset(
+                    KEY_MARMOT_CLIENTS,
+                    mapping={
+                        guid: dump_marmot_public_key(pubkey)
+                        for guid, pubkey in fs_config.server.clients.items()
+                    },
+                )
+            for index, (name, channel) in enumerate(channels):
+                state = states[index * 3 : index * 3 + 3]
+                await self._queue_channel_update(pipe, name, channel, state)
+            await pipe.execute()
 
     async def dump(self) -> MarmotConfig:
         """Dump backend state as marmot configuration"""
-        clients = await self._redis.hgetall(KEY_MARMOT_CLIENTS)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(KEY_MARMOT_CLIENTS)
+            pipe.smembers(KEY_MARMOT_CHANNELS)
+            clients, channels_ = await pipe.execute()
         clients = {
             guid: load_marmot_public_key(pubkey)
             for guid, pubkey in clients.items()
         }
-        channels = {}
-        channels_ = set(await self._redis.smembers(KEY_MARMOT_CHANNELS))
-        for channel in channels_:
-            listeners = await self._redis.hkeys(
-                _marmot_channel_listeners(channel)
-            )
-            whistlers = await self._redis.smembers(
-                _marmot_channel_whistlers(channel)
-            )
-            channels[channel] = MarmotChannelConfig(
+        channels_ = list(channels_)
+        # fetch listeners and whistlers of every channel in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel in channels_:
+                pipe.hkeys(_marmot_channel_listeners(channel))
+                pipe.smembers(_marmot_channel_whistlers(channel))
+            results = await pipe.execute()
+        channels = {
+            channel: MarmotChannelConfig(
                 listeners=set(listeners), whistlers=set(whistlers)
             )
+            for channel, listeners, whistlers in zip(
+                channels_, results[::2], results[1::2]
+            )
+        }
         return MarmotConfig(
             server=MarmotServerConfig(
                 host='',
@@ -241,33 +484,95 @@ class MarmotServerBackend:
                 redis=MarmotRedisConfig(
                     url=self._url,
                     max_connections=self._max_connections,
+                    stream_maxlen=self._stream_maxlen,
+                    max_listeners=self._max_listeners,
                 ),
                 clients=clients,
                 channels=channels,
             )
         )
 
-    async def can_listen(
-        self, guid: str, channels: t.Set[str], signature: str
+    def _cached_pubkey(
+        self, role: str, guid: str, channels: t.List[str]
+    ) -> t.Optional[str]:
+        # return client public key if role was granted for every channel
+        now = monotonic()
+        pubkeys = set()
+        for channel in channels:
+            entry = self._authz_cache.get((role, guid, channel))
+            if entry is None or entry[0] < now:
+                return None
+            pubkeys.add(entry[1])
+        # entries cached before a key update must not be mixed
+        return pubkeys.pop() if len(pubkeys) == 1 else None
+
+    def _cache_pubkey(
+        self, role: str, guid: str, channels: t.List[str], pubkey: str
     ):
-        """Determine if marmot can listen"""
-        pubkey = await self._redis.hget(KEY_MARMOT_CLIENTS, guid)
+        if len(self._authz_cache) >= AUTHZ_CACHE_MAXSIZE:
+            self._authz_cache.clear()
+        expires = monotonic() + AUTHZ_CACHE_TTL
+        for channel in channels:
+            self._authz_cache[(role, guid, channel)] = (expires, pubkey)
+
+    async def _fetch_listener_pubkey(
+        self, guid: str, channels: t.List[str]
+    ) -> t.Optional[str]:
+        # fetch everything needed for the decision in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hget(KEY_MARMOT_CLIENTS, guid)
+            for channel in channels:
+                pipe.sismember(KEY_MARMOT_CHANNELS, channel)
+                pipe.hexists(_marmot_channel_listeners(channel), guid)
+            pubkey, *counts = await pipe.execute()
         if not pubkey:
             LOGGER.error("unknown client: %s", guid)
-            return False
-        for channel in channels:
-            count = await self._redis.sismember(KEY_MARMOT_CHANNELS, channel)
-            if count == 0:
+            return None
+        for channel, is_channel, is_listener in zip(
+            channels, counts[::2], counts[1::2]
+        ):
+            if not is_channel:
                 LOGGER.error("unknown channel: %s", channel)
-                return False
-            key = _marmot_channel_listeners(channel)
-            count = await self._redis.hexists(key, guid)
-            if count == 0:
+                return None
+            if not is_listener:
                 LOGGER.error("unknown channel listener: %s", guid)
+                return None
+        return pubkey
+
+    async def _fetch_whistler_pubkey(
+        self, guid: str, channel: str
+    ) -> t.Optional[str]:
+        # fetch everything needed for the decision in a single round trip
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hget(KEY_MARMOT_CLIENTS, guid)
+            pipe.sismember(KEY_MARMOT_CHANNELS, channel)
+            pipe.sismember(_marmot_channel_whistlers(channel), guid)
+            pubkey, is_channel, is_whistler = await pipe.execute()
+        if not pubkey:
+            LOGGER.error("unknown client: %s", guid)
+            return None
+        if not is_channel:
+            LOGGER.error("unknown channel: %s", channel)
+            return None
+        if not is_whistler:
+            LOGGER.error("unknown channel whistler: %s", guid)
+            return None
+        return pubkey
+
+    async def can_listen(
+        self, guid: str, channels: t.Iterable[str], signature: str
+    ):
+        """Determine if marmot can listen"""
+        # nearly free when channels are already sorted
+        channels = sorted(channels)
+        pubkey = self._cached_pubkey('listener', guid, channels)
+        if pubkey is None:
+            pubkey = await self._fetch_listener_pubkey(guid, channels)
+            if pubkey is None:
                 return False
+            self._cache_pubkey('listener', guid, channels, pubkey)
         digest = hash_marmot_listen_params(guid, channels)
-        pubkey = load_marmot_public_key(pubkey)
-        if not verify_marmot_data_digest(pubkey, digest, signature):
+        if not _verify_client_signature(pubkey, digest, signature):
             LOGGER.error("signature verification failed.")
             return False
         return True
@@ -275,22 +580,16 @@ class MarmotServerBackend:
     async def can_whistle(self, message):
         """Determine if marmot can whistle"""
         guid = message.whistler
-        channel = message.channel
-        pubkey = await self._redis.hget(KEY_MARMOT_CLIENTS, guid)
-        if not pubkey:
-            LOGGER.error("unknown client: %s", guid)
-            return False
-        count = await self._redis.sismember(KEY_MARMOT_CHANNELS, channel)
-        if count == 0:
-            LOGGER.error("unknown channel: %s", channel)
-            return False
-        key = _marmot_channel_whistlers(channel)
-        count = await self._redis.sismember(key, guid)
-        if count == 0:
-            LOGGER.error("unknown channel whistler: %s", guid)
-            return False
-        pubkey = load_marmot_public_key(pubkey)
-        if not message.verify(pubkey):
+        channels = [message.channel]
+        pubkey = self._cached_pubkey('whistler', guid, channels)
+        if pubkey is None:
+            pubkey = await self._fetch_whistler_pubkey(guid, message.channel)
+            if pubkey is None:
+                return False
+            self._cache_pubkey('whistler', guid, channels, pubkey)
+        if not _verify_client_signature(
+            pubkey, message.digest, message.signature
+        ):
             LOGGER.error("signature verification failed.")
             return False
         return True
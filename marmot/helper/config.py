@@ -1,9 +1,13 @@
 """Marmot configuration helper
 """
 import typing as t
+from os import O_CREAT, O_EXCL, O_WRONLY, fsync, open as os_open, replace
 from re import compile as re_compile
-from json import JSONDecodeError, loads, dumps
+from stat import S_IMODE
+from json import JSONDecodeError
 from pathlib import Path
+from functools import lru_cache
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from yarl import URL
 from .crypto import (
@@ -14,28 +18,36 @@ from .crypto import (
     load_marmot_private_key,
     dump_marmot_private_key,
 )
+from .json import loads, dumps_indented
 from .logging import LOGGER
 
 
 CLIENT_PATTERN = re_compile(r'[a-z\d]+([_\-][a-z\d]+)*')
 CHANNEL_PATTERN = CLIENT_PATTERN
+# bound methods, validation runs once per entry when loading configuration
+_CLIENT_FULLMATCH = CLIENT_PATTERN.fullmatch
+_CHANNEL_FULLMATCH = CHANNEL_PATTERN.fullmatch
 
 DEFAULT_REDIS_URL = 'redis://localhost'
 DEFAULT_REDIS_MAXCONN = 50
 DEFAULT_REDIS_TRIMFREQ = 300
+DEFAULT_REDIS_STREAM_MAXLEN = 10000
+DEFAULT_REDIS_MAXLISTENERS = 100
 DEFAULT_MARMOT_HOST = '127.0.0.1'
 DEFAULT_MARMOT_PORT = 1758
 DEFAULT_MARMOT_URL = URL.build(
     scheme='http', host=DEFAULT_MARMOT_HOST, port=DEFAULT_MARMOT_PORT
 )
 DEFAULT_MARMOT_CAPATH = Path.home() / '.config' / 'marmot' / 'ca.pem'
+# configuration files may hold a private key
+CONFIG_FILE_MODE = 0o600
 
 
 class MarmotConfigError(Exception):
     """Raised when configuration error is encountered"""
 
 
-@dataclass
+@dataclass(slots=True)
 class MarmotChannelConfig:
     """Marmot channel configuration"""
 
@@ -53,8 +65,8 @@ class MarmotChannelConfig:
     def to_dict(self):
         """Convert configuration object to JSON serializable dict"""
         return {
-            'whistlers': list(sorted(list(self.whistlers))),
-            'listeners': list(sorted(list(self.listeners))),
+            'whistlers': sorted(self.whistlers),
+            'listeners': sorted(self.listeners),
         }
 
     def add_whistler(self, guid):
@@ -74,13 +86,15 @@ class MarmotChannelConfig:
         self.listeners.discard(guid)
 
 
-@dataclass
+@dataclass(slots=True)
 class MarmotRedisConfig:
     """Marmot redis configuration"""
 
     url: str = DEFAULT_REDIS_URL
     trim_freq: int = DEFAULT_REDIS_TRIMFREQ
     max_connections: int = DEFAULT_REDIS_MAXCONN
+    stream_maxlen: int = DEFAULT_REDIS_STREAM_MAXLEN
+    max_listeners: int = DEFAULT_REDIS_MAXLISTENERS
 
     @classmethod
     def from_dict(cls, dct) -> 'MarmotRedisConfig':
@@ -91,6 +105,12 @@ class MarmotRedisConfig:
             max_connections=int(
                 dct.get('max_connections', DEFAULT_REDIS_MAXCONN)
             ),
+            stream_maxlen=int(
+                dct.get('stream_maxlen', DEFAULT_REDIS_STREAM_MAXLEN)
+            ),
+            max_listeners=int(
+                dct.get('max_listeners', DEFAULT_REDIS_MAXLISTENERS)
+            ),
         )
 
     def to_dict(self):
@@ -99,24 +119,26 @@ class MarmotRedisConfig:
             'url': self.url,
             'trim_freq': self.trim_freq,
             'max_connections': self.max_connections,
+            'stream_maxlen': self.stream_maxlen,
+            'max_listeners': self.max_listeners,
         }
 
 
 def validate_guid(guid: str) -> str:
     """Validate client against naming convention"""
-    if not CLIENT_PATTERN.fullmatch(guid):
+    if not _CLIENT_FULLMATCH(guid):
         raise MarmotConfigError("guid naming error!")
     return guid
 
 
 def validate_channel(channel: str) -> str:
     """Validate channel against naming convention"""
-    if not CHANNEL_PATTERN.fullmatch(channel):
+    if not _CHANNEL_FULLMATCH(channel):
         raise MarmotConfigError("channel naming error!")
     return channel
 
 
-@dataclass
+@dataclass(slots=True)
 class MarmotServerConfig:
     """Marmot server configuration"""
 
@@ -235,8 +257,32 @@ class MarmotServerConfig:
             return
         channel.rem_listener(guid)
 
+    def apply(self, operation: str, *arguments):
+        """Apply operation named after the matching marmot-config command"""
+        method = SERVER_OPERATIONS.get(operation)
+        if not method:
+            raise MarmotConfigError(f"unknown operation: {operation}")
+        try:
+            method(self, *arguments)
+        except TypeError as exc:
+            raise MarmotConfigError(
+                f"wrong number of arguments for operation: {operation}"
+            ) from exc
+
+
+SERVER_OPERATIONS = {
+    'add-client': MarmotServerConfig.add_client,
+    'rem-client': MarmotServerConfig.rem_client,
+    'add-channel': MarmotServerConfig.add_channel,
+    'rem-channel': MarmotServerConfig.rem_channel,
+    'add-whistler': MarmotServerConfig.add_whistler,
+    'rem-whistler': MarmotServerConfig.rem_whistler,
+    'add-listener': MarmotServerConfig.add_listener,
+    'rem-listener': MarmotServerConfig.rem_listener,
+}
 
-@dataclass
+
+@dataclass(slots=True)
 class MarmotClientConfig:
     """Marmot client configuration"""
 
@@ -267,7 +313,7 @@ class MarmotClientConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class MarmotConfig:
     """Marmot configuration"""
 
@@ -277,16 +323,42 @@ class MarmotConfig:
     @classmethod
     def from_filepath(cls, filepath: Path) -> 'MarmotConfig':
         """Load marmot configuration from filepath"""
-        if not filepath.is_file():
+        try:
+            return cls._from_filepath_cached(filepath)
+        except FileNotFoundError as exc:
             raise MarmotConfigError(
                 f"cannot find configuration file: {filepath}"
-            )
+            ) from exc
+
+    @classmethod
+    def from_filepath_or_empty(cls, filepath: Path) -> 'MarmotConfig':
+        """Load marmot configuration from filepath, empty if file is missing"""
+        try:
+            return cls._from_filepath_cached(filepath)
+        except FileNotFoundError:
+            return cls()
+
+    @classmethod
+    def _from_filepath_cached(cls, filepath: Path) -> 'MarmotConfig':
+        # modification time and size are part of the cache key, changes on
+        # disk invalidate the cached configuration
+        stat = filepath.stat()
+        return _load_marmot_config(
+            str(filepath), stat.st_mtime_ns, stat.st_size
+        )
+
+    @classmethod
+    def _from_filepath(cls, filepath: Path) -> 'MarmotConfig':
+        # FileNotFoundError is left to the caller, a single open replaces
+        # is_file() followed by read_bytes()
         try:
-            dct = loads(filepath.read_text())
-        except PermissionError as exc:
+            data = filepath.read_bytes()
+        except (PermissionError, IsADirectoryError) as exc:
             raise MarmotConfigError(
                 f"cannot read configuration file: {filepath}"
             ) from exc
+        try:
+            dct = loads(data)
         except JSONDecodeError as exc:
             raise MarmotConfigError(
                 f"cannot decode configuration file: {filepath}"
@@ -305,6 +377,20 @@ class MarmotConfig:
         except Exception as exc:
             raise MarmotConfigError(f"{exc}") from exc
 
+    @classmethod
+    @contextmanager
+    def edit(cls, filepath: Path) -> t.Iterator['MarmotConfig']:
+        """Load marmot configuration and dump it back once edited"""
+        # edited configuration must not be shared with cached instances
+        try:
+            config = cls._from_filepath(filepath)
+        except FileNotFoundError as exc:
+            raise MarmotConfigError(
+                f"cannot find configuration file: {filepath}"
+            ) from exc
+        yield config
+        config.to_filepath(filepath)
+
     def to_filepath(self, filepath: Path):
         """Dump marmot configuration to filepath"""
         dct = {}
@@ -312,4 +398,39 @@ class MarmotConfig:
             dct['client'] = self.client.to_dict()
         if self.server:
             dct['server'] = self.server.to_dict()
-        filepath.write_text(dumps(dct, indent=2))
+        # write to a sibling file then rename it so that a crash never leaves
+        # a truncated configuration behind, symlinks are replaced at target
+        filepath = filepath.resolve()
+        try:
+            mode = S_IMODE(filepath.stat().st_mode)
+        except FileNotFoundError:
+            mode = CONFIG_FILE_MODE
+        tmp_filepath = filepath.with_name(f'{filepath.name}.tmp')
+        # leftover of an interrupted write
+        tmp_filepath.unlink(missing_ok=True)
+        # created with its final mode, the private key is never exposed
+        fd = os_open(tmp_filepath, O_WRONLY | O_CREAT | O_EXCL, mode)
+        try:
+            with open(fd, 'wb') as fobj:
+                fobj.write(dumps_indented(dct))
+                fobj.flush()
+                fsync(fobj.fileno())
+            replace(tmp_filepath, filepath)
+        except BaseException:
+            tmp_filepath.unlink(missing_ok=True)
+            raise
+        # cached configuration objects may have been mutated by the caller
+        clear_marmot_config_cache()
+
+
+@lru_cache(maxsize=8)
+def _load_marmot_config(
+    filepath: str, mtime_ns: int, size: int
+) -> MarmotConfig:
+    # mtime_ns and size are only part of the cache key
+    return MarmotConfig._from_filepath(Path(filepath))
+
+
+def clear_marmot_config_cache():
+    """Drop cached configurations, files are parsed again on next load"""
+    _load_marmot_config.cache_clear()
@@ -2,10 +2,12 @@
 """
 import typing as t
 from ssl import SSLContext, Purpose, create_default_context
+from stat import S_ISREG
 from base64 import b64encode, b64decode
+from hashlib import sha256
 from pathlib import Path
+from functools import lru_cache
 from cryptography.exceptions import InvalidSignature
-from cryptography.hazmat.primitives.hashes import Hash, SHA256
 from cryptography.hazmat.primitives.serialization import (
     Encoding,
     PublicFormat,
@@ -23,34 +25,84 @@ from .logging import LOGGER
 from .secret_provider import SECRET_PROVIDER
 
 
+# key objects are neither hashable nor weak-referenceable, dumped public keys
+# are memoized by id and the entry keeps a reference to the key so that its
+# id cannot be reused while the entry lives
+_PUBLIC_KEY_DUMPS: t.Dict[int, t.Tuple[MarmotPublicKey, str]] = {}
+_PUBLIC_KEY_DUMPS_MAXSIZE = 4096
+
+
+@lru_cache(maxsize=8)
+def _load_marmot_ssl_context(
+    capath: str, mtime_ns: int, size: int
+) -> SSLContext:
+    # mtime_ns and size are only part of the cache key, a modified CA file is
+    # reloaded
+    cadata = Path(capath).read_text()
+    return create_default_context(purpose=Purpose.SERVER_AUTH, cadata=cadata)
+
+
 def create_marmot_ssl_context(capath: Path) -> t.Optional[SSLContext]:
     """Create SSL context for marmot client"""
-    if not capath.is_file():
+    # a single stat both checks the file and builds the cache key
+    try:
+        stat = capath.stat()
+    except FileNotFoundError:
+        stat = None
+    if stat is None or not S_ISREG(stat.st_mode):
         LOGGER.error("cannot find CA path: %s", capath)
         return None
-    cadata = capath.read_text()
-    return create_default_context(purpose=Purpose.SERVER_AUTH, cadata=cadata)
+    return _load_marmot_ssl_context(
+        str(capath), stat.st_mtime_ns, stat.st_size
+    )
 
 
+def clear_marmot_ssl_context_cache():
+    """Drop cached SSL contexts, CA files are read again on next creation"""
+    _load_marmot_ssl_context.cache_clear()
+
+
+@lru_cache(maxsize=4096)
 def load_marmot_public_key(b64_der_data: str) -> MarmotPublicKey:
     """Load a public key"""
+    # keys are immutable, configuration reloads and backend lookups share the
+    # parsed key for identical key material
     return load_der_public_key(b64decode(b64_der_data))
 
 
 def dump_marmot_public_key(pubkey: MarmotPublicKey) -> str:
     """Dump a public key"""
+    entry = _PUBLIC_KEY_DUMPS.get(id(pubkey))
+    if entry is not None:
+        return entry[1]
     der_data = pubkey.public_bytes(
         Encoding.DER, PublicFormat.SubjectPublicKeyInfo
     )
-    return b64encode(der_data).decode()
+    b64_der_data = b64encode(der_data).decode()
+    if len(_PUBLIC_KEY_DUMPS) >= _PUBLIC_KEY_DUMPS_MAXSIZE:
+        _PUBLIC_KEY_DUMPS.clear()
+    _PUBLIC_KEY_DUMPS[id(pubkey)] = (pubkey, b64_der_data)
+    return b64_der_data
 
 
 def load_marmot_private_key(b64_der_data: str) -> MarmotPrivateKey:
     """Load a passphrase protected private key"""
+    der_data = b64decode(b64_der_data)
+    # unprotected keys load without a secret, secret provider is not asked
+    # for it and scripted invocations stay non-interactive
+    try:
+        return load_der_private_key(der_data, None)
+    except TypeError:
+        pass
     secret = SECRET_PROVIDER.fetch()
     if not secret:
         secret = None
-    prikey = load_der_private_key(b64decode(b64_der_data), secret)
+    try:
+        prikey = load_der_private_key(der_data, secret)
+    except (ValueError, TypeError):
+        # do not keep a wrong secret, next attempt fetches it again
+        SECRET_PROVIDER.invalidate()
+        raise
     LOGGER.info("passphrase is correct.")
     return prikey
 
@@ -74,18 +126,16 @@ def generate_marmot_private_key() -> MarmotPrivateKey:
 
 def hash_marmot_data(data: bytes) -> bytes:
     """Compute marmot data digest"""
-    digest = Hash(SHA256())
-    digest.update(data)
-    return digest.finalize()
+    return sha256(data).digest()
 
 
 def hash_marmot_listen_params(
     guid: str, channels: t.Union[t.Set[str], t.List[str]]
 ) -> bytes:
     """Compute marmot listen params digest"""
-    params = [guid]
-    params.extend(sorted(set(channels)))
-    return hash_marmot_data(':'.join(params).encode())
+    params = [guid.encode()]
+    params.extend(channel.encode() for channel in sorted(set(channels)))
+    return hash_marmot_data(b':'.join(params))
 
 
 def sign_marmot_data_digest(prikey: MarmotPrivateKey, digest: bytes) -> str:
@@ -93,6 +143,14 @@ def sign_marmot_data_digest(prikey: MarmotPrivateKey, digest: bytes) -> str:
     return b64encode(prikey.sign(digest)).decode()
 
 
+def sign_marmot_data_digests(
+    prikey: MarmotPrivateKey, digests: t.Iterable[bytes]
+) -> t.List[str]:
+    """Sign several marmot data digests using the same private key"""
+    sign = prikey.sign
+    return [b64encode(sign(digest)).decode() for digest in digests]
+
+
 def verify_marmot_data_digest(
     pubkey: MarmotPublicKey, digest: bytes, signature: str
 ) -> bool:
@@ -1,9 +1,17 @@
 """EventSource
 """
 import typing as t
+from re import compile as re_compile
 from dataclasses import dataclass
 
 
+# marmot server terminates lines with CRLF, an empty line ends an event,
+# the stream parser accepts CRLF, LF and CR as the specification requires
+LINE_SEPARATOR = b'\r\n'
+LINE_TERMINATORS = (b'\n', b'\r')
+DATA_SEPARATOR_PATTERN = re_compile(r'\r\n|\r|\n')
+
+
 @dataclass
 class Event:
     """Event"""
@@ -14,33 +22,92 @@ class Event:
     retry: t.Optional[int] = None
 
 
+def _set_id(event: Event, value: bytes):
+    event.id_ = value
+
+
+def _set_event(event: Event, value: bytes):
+    event.event = value
+
+
+def _set_retry(event: Event, value: bytes):
+    # non-digit retry values are ignored as required by the specification
+    if value.isdigit():
+        event.retry = int(value)
+
+
+FIELD_HANDLERS = {
+    b'id': _set_id,
+    b'event': _set_event,
+    b'retry': _set_retry,
+}
+
+
 def parse_event(event_lines):
     """Parse a server-side event"""
     event = Event()
+    # data fragments are joined once, repeated bytes concatenation would
+    # copy the whole buffer for each line
+    data = []
     for line in event_lines:
-        if line.startswith(b'id:'):
-            event.id_ = line.split(b': ', 1)[-1]
-        if line.startswith(b'event:'):
-            event.event = line.split(b': ', 1)[-1]
-        if line.startswith(b'data:'):
-            event.data += line.split(b': ', 1)[-1]
-        if line.startswith(b'retry:'):
-            event.retry = int(line.split(b': ', 1)[-1].decode())
+        # the space following the colon is optional
+        field, _, value = line.partition(b':')
+        value = value.removeprefix(b' ')
+        if field == b'data':
+            data.append(value)
+            continue
+        handler = FIELD_HANDLERS.get(field)
+        if handler:
+            handler(event, value)
+    if data:
+        event.data = b'\n'.join(data)
     return event
 
 
+def format_event(event: str, data: str) -> bytes:
+    """Format a server-side event"""
+    # serialized JSON payloads never span multiple lines, encode the whole
+    # frame at once
+    if '\n' not in data and '\r' not in data:
+        return f'event: {event}\r\ndata: {data}\r\n\r\n'.encode()
+    # multi-line data is sent as several data fields, as sse_response does
+    lines = [f'event: {event}'.encode()]
+    lines.extend(
+        f'data: {chunk}'.encode()
+        for chunk in DATA_SEPARATOR_PATTERN.split(data)
+    )
+    lines.append(LINE_SEPARATOR)
+    return LINE_SEPARATOR.join(lines)
+
+
 async def event_source_stream(resp, stop_event):
     """Yield events from event source stream"""
+    # buffered data is split in lines at once instead of awaiting each line,
+    # the read size does not depend on the length of lines or events
+    partial_line = b''
+    skip_lf = False
     event_lines = []
     while not stop_event.is_set():
-        line = (await resp.content.readline()).rstrip()
-        if line:
-            if line.startswith(b':'):
+        chunk = await resp.content.readany()
+        # end of stream, an incomplete event is discarded
+        if not chunk:
+            break
+        # CR ending the previous chunk may be the first half of a CRLF
+        if skip_lf and chunk.startswith(b'\n'):
+            chunk = chunk[1:]
+        data = partial_line + chunk
+        skip_lf = data.endswith(b'\r')
+        lines = data.splitlines(keepends=True)
+        partial_line = b''
+        if lines and not lines[-1].endswith(LINE_TERMINATORS):
+            partial_line = lines.pop()
+        for line in lines:
+            line = line.rstrip(b'\r\n')
+            if not line:
+                # empty line dispatches the pending event
+                if event_lines:
+                    yield parse_event(event_lines)
+                    event_lines = []
                 continue
-            event_lines.append(line)
-            continue
-        # if event buffer is not empty, parse event
-        if event_lines:
-            yield parse_event(event_lines)
-        # reset event buffer
-        event_lines.clear()
+            if not line.startswith(b':'):
+                event_lines.append(line)
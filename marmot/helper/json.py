@@ -0,0 +1,33 @@
+"""Marmot JSON helper
+
+orjson is used when installed, stdlib json is used otherwise.
+"""
+import typing as t
+
+__all__ = ['loads', 'dumps', 'dumps_bytes', 'dumps_indented']
+
+try:
+    from orjson import OPT_INDENT_2, loads, dumps as _orjson_dumps
+
+    def dumps(obj: t.Any) -> str:
+        """Serialize object as a JSON formatted string"""
+        return _orjson_dumps(obj).decode()
+
+    def dumps_bytes(obj: t.Any) -> bytes:
+        """Serialize object as JSON formatted UTF-8 bytes"""
+        return _orjson_dumps(obj)
+
+    def dumps_indented(obj: t.Any) -> bytes:
+        """Serialize object as indented JSON formatted UTF-8 bytes"""
+        return _orjson_dumps(obj, option=OPT_INDENT_2)
+
+except ImportError:
+    from json import loads, dumps
+
+    def dumps_bytes(obj: t.Any) -> bytes:
+        """Serialize object as JSON formatted UTF-8 bytes"""
+        return dumps(obj).encode()
+
+    def dumps_indented(obj: t.Any) -> bytes:
+        """Serialize object as indented JSON formatted UTF-8 bytes"""
+        return dumps(obj, indent=2).encode()
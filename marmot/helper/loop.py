@@ -0,0 +1,44 @@
+"""Marmot event loop helper
+
+uvloop is used when installed, asyncio default event loop is used otherwise.
+"""
+import typing as t
+from signal import SIGINT, SIGTERM, getsignal, signal
+
+try:
+    from uvloop import new_event_loop
+except ImportError:
+    from asyncio import new_event_loop
+
+
+def new_marmot_loop():
+    """Create a new event loop"""
+    return new_event_loop()
+
+
+def run_marmot_loop(
+    coro: t.Coroutine,
+    termination_handler: t.Optional[t.Callable[[], None]] = None,
+):
+    """Run coroutine in a new event loop and shut the loop down cleanly"""
+    loop = new_marmot_loop()
+    signals = (SIGINT, SIGTERM) if termination_handler else ()
+    # loop handlers replace the handlers installed before, keep them
+    previous_handlers = {signum: getsignal(signum) for signum in signals}
+    for signum in signals:
+        loop.add_signal_handler(signum, termination_handler)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        # removing loop handlers resets signals to their default handler,
+        # handlers installed before are restored afterwards
+        for signum, handler in previous_handlers.items():
+            loop.remove_signal_handler(signum)
+            # None means the handler was not installed from Python
+            if handler is not None:
+                signal(signum, handler)
+        try:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
@@ -54,14 +54,25 @@ class _SecretProvider:
 
     def __init__(self):
         self._backend = _BACKEND[SecretProviderBackend.GETPASS]
+        self._fetched = False
+        self._secret = None
 
     def select(self, backend: SecretProviderBackend):
         """Initialize provider backend"""
         self._backend = _BACKEND[backend]
+        self.invalidate()
 
     def fetch(self) -> t.Optional[bytes]:
-        """Fetch secret"""
-        return self._backend()
+        """Fetch secret, backend is called once until invalidated"""
+        if not self._fetched:
+            self._secret = self._backend()
+            self._fetched = True
+        return self._secret
+
+    def invalidate(self):
+        """Drop fetched secret, backend is called again on next fetch"""
+        self._fetched = False
+        self._secret = None
 
 
 SECRET_PROVIDER = _SecretProvider()
@@ -1,9 +1,12 @@
 """Marmot client
 """
-from json import dumps
-from signal import SIGINT, SIGTERM
+import typing as t
+from os import environ
+from sys import stdout
+from shutil import which
 from pathlib import Path
-from asyncio import Event, new_event_loop, create_subprocess_exec
+from asyncio import Event, create_subprocess_exec
+from asyncio.subprocess import PIPE
 from argparse import ArgumentParser
 from rich.markup import escape
 from rich.console import Console
@@ -11,6 +14,8 @@ from . import Marmot, MarmotRole, MarmotMessage
 from .__version__ import version
 from .helper.api import MarmotMessageLevel
 from .helper.config import MarmotConfig, MarmotConfigError
+from .helper.json import dumps
+from .helper.loop import run_marmot_loop
 from .helper.logging import LOGGER
 from .helper.secret_provider import (
     SECRET_PROVIDER,
@@ -22,6 +27,9 @@ from .helper.secret_provider import (
 BANNER = f"Marmot Listen {version}"
 CONSOLE = Console()
 STOP_EVENT = Event()
+# executables only inherit PATH, the rest of the environment might hold
+# secrets such as the private key passphrase
+BASE_ENV = {'PATH': environ.get('PATH', '')}
 LEVEL_STYLE_MAP = {
     MarmotMessageLevel.CRITICAL: 'blink bold reverse red',
     MarmotMessageLevel.ERROR: 'blink bold red',
@@ -29,42 +37,113 @@ LEVEL_STYLE_MAP = {
     MarmotMessageLevel.INFO: 'blue',
     MarmotMessageLevel.DEBUG: 'green',
 }
+# level tags do not depend on the message, format them once
+LEVEL_PREFIX_MAP = {
+    level: f"[[{style}]{level.name:>8s}[/]]"
+    for level, style in LEVEL_STYLE_MAP.items()
+}
+LEVEL_PLAIN_PREFIX_MAP = {
+    level: f"[{level.name:>8s}]" for level in LEVEL_STYLE_MAP
+}
 
 
 def _display(message: MarmotMessage):
-    level = f"[{LEVEL_STYLE_MAP[message.level]}]{message.level.name:>8s}[/]"
+    if not CONSOLE.is_terminal:
+        # styles would be stripped anyway, skip markup rendering
+        prefix = LEVEL_PLAIN_PREFIX_MAP[message.level]
+        stdout.write(
+            f"{prefix}({message.channel}|{message.whistler}): "
+            f"{message.content}\n"
+        )
+        # pipes are block buffered, messages must not wait for the buffer
+        # to fill up
+        stdout.flush()
+        return
+    prefix = LEVEL_PREFIX_MAP[message.level]
     sender = f"[bold]{escape(message.channel)}[/]|{escape(message.whistler)}"
-    line = f"[{level}]({sender}): {escape(message.content)}"
+    line = f"{prefix}({sender}): {escape(message.content)}"
     CONSOLE.print(line)
 
 
+def _resolve_executable(executable: Path) -> t.Optional[Path]:
+    # an absolute path skips the PATH lookup on each spawn and allows
+    # subprocess to use posix_spawn instead of fork and exec
+    resolved = which(executable, path=BASE_ENV['PATH'])
+    if not resolved:
+        return None
+    return Path(resolved).absolute()
+
+
 async def _exec(executable: Path, message: MarmotMessage):
+    # file descriptors are non-inheritable by default, not closing them
+    # explicitly is what allows subprocess to use posix_spawn
     process = await create_subprocess_exec(
         executable,
-        env={
-            'MARMOT_MSG_LEVEL': message.level.name,
-            'MARMOT_MSG_CHANNEL': message.channel,
-            'MARMOT_MSG_WHISTLER': message.whistler,
-            'MARMOT_MSG_CONTENT': message.content,
-        },
+        env=BASE_ENV | message.to_env(),
+        close_fds=False,
     )
     await process.wait()
 
 
+async def _spawn_batch(executable: Path):
+    # messages are written to stdin, one JSON object per line
+    return await create_subprocess_exec(
+        executable, stdin=PIPE, env=BASE_ENV, close_fds=False
+    )
+
+
+async def _exec_batch(executable: Path, process, message: MarmotMessage):
+    line = dumps(message.to_dict()).encode() + b'\n'
+    for _ in range(2):
+        if process is None or process.returncode is not None:
+            process = await _spawn_batch(executable)
+        try:
+            process.stdin.write(line)
+            await process.stdin.drain()
+            return process
+        except (BrokenPipeError, ConnectionResetError):
+            LOGGER.warning("batch executable exited, spawning it again...")
+            await process.wait()
+            process = None
+    LOGGER.error("batch executable keeps exiting, message dropped.")
+    return process
+
+
+async def _stop_batch(process):
+    if process is None or process.returncode is not None:
+        return
+    process.stdin.close()
+    await process.wait()
+
+
 async def _async_listen(args):
     config = MarmotConfig.from_filepath(args.config)
     if not config.client:
         LOGGER.error("cannot find client configuration in: %s", args.config)
         return
+    executable = None
+    if args.executable:
+        executable = _resolve_executable(args.executable)
+        if not executable:
+            LOGGER.error("cannot find executable: %s", args.executable)
+            return
+    process = None
     async with Marmot.create_client(MarmotRole.LISTENER, config) as client:
         marmot = Marmot(config, client)
-        async for message in marmot.listen(set(args.channels), STOP_EVENT):
-            if args.json:
-                print(dumps(message.to_dict()))
-            else:
-                _display(message)
-            if args.executable:
-                await _exec(args.executable, message)
+        try:
+            async for message in marmot.listen(args.channels, STOP_EVENT):
+                if args.json:
+                    print(dumps(message.to_dict()))
+                else:
+                    _display(message)
+                if not executable:
+                    continue
+                if args.batch:
+                    process = await _exec_batch(executable, process, message)
+                else:
+                    await _exec(executable, message)
+        finally:
+            await _stop_batch(process)
 
 
 def _termination_handler():
@@ -75,11 +154,7 @@ def _termination_handler():
 
 def _listen(args):
     STOP_EVENT.clear()
-    loop = new_event_loop()
-    loop.add_signal_handler(SIGINT, _termination_handler)
-    loop.add_signal_handler(SIGTERM, _termination_handler)
-    loop.run_until_complete(_async_listen(args))
-    loop.close()
+    run_marmot_loop(_async_listen(args), _termination_handler)
 
 
 def _parse_args():
@@ -105,6 +180,14 @@ def _parse_args():
         type=Path,
         help="invoke executable with message properties passed in environment variables",
     )
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help=(
+            "start executable once and pass messages on its standard input, "
+            "one JSON object per line"
+        ),
+    )
     parser.add_argument(
         'channels',
         metavar='channel',
@@ -112,7 +195,10 @@ def _parse_args():
         help="marmot channel to listen to",
     )
     parser.set_defaults(func=_listen)
-    return parser.parse_args()
+    args = parser.parse_args()
+    # built once, subscriptions reuse it as is
+    args.channels = frozenset(args.channels)
+    return args
 
 
 def app():
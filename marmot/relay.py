@@ -1,14 +1,14 @@
 """Marmot client
 """
-from signal import SIGINT, SIGTERM
 from pathlib import Path
-from asyncio import Event, new_event_loop
+from asyncio import Event
 from argparse import ArgumentParser
 from yarl import URL
 from rich.console import Console
 from . import Marmot, MarmotRole
 from .__version__ import version
 from .helper.config import MarmotConfig, MarmotClientConfig, MarmotConfigError
+from .helper.loop import run_marmot_loop
 from .helper.logging import LOGGER
 from .helper.secret_provider import (
     SECRET_PROVIDER,
@@ -35,15 +35,39 @@ async def _async_relay(args):
             prikey=l_config.client.prikey,
         )
     )
-    async with Marmot.create_client(MarmotRole.LISTENER, l_config) as l_client:
+    # a single connector shares keepalive connections and DNS cache between
+    # both sessions, unless they need distinct CA files
+    shared_config = _shared_connector_config(l_config, w_config)
+    connector = (
+        Marmot.create_connector(shared_config) if shared_config else None
+    )
+    try:
+        await _relay_messages(args, l_config, w_config, connector)
+    finally:
+        if connector is not None:
+            await connector.close()
+
+
+def _shared_connector_config(l_config, w_config):
+    l_secure = l_config.client.url.scheme == 'https'
+    w_secure = w_config.client.url.scheme == 'https'
+    if l_secure and w_secure:
+        if l_config.client.capath != w_config.client.capath:
+            return None
+        return l_config
+    return w_config if w_secure else l_config
+
+
+async def _relay_messages(args, l_config, w_config, connector):
+    async with Marmot.create_client(
+        MarmotRole.LISTENER, l_config, connector
+    ) as l_client:
         async with Marmot.create_client(
-            MarmotRole.WHISTLER, w_config
+            MarmotRole.WHISTLER, w_config, connector
         ) as w_client:
             l_marmot = Marmot(l_config, l_client)
             w_marmot = Marmot(w_config, w_client)
-            async for message in l_marmot.listen(
-                set(args.channels), STOP_EVENT
-            ):
+            async for message in l_marmot.listen(args.channels, STOP_EVENT):
                 published = await w_marmot.whistle([message])
                 if published[0]:
                     LOGGER.info(
@@ -67,11 +91,7 @@ def _termination_handler():
 
 def _relay(args):
     STOP_EVENT.clear()
-    loop = new_event_loop()
-    loop.add_signal_handler(SIGINT, _termination_handler)
-    loop.add_signal_handler(SIGTERM, _termination_handler)
-    loop.run_until_complete(_async_relay(args))
-    loop.close()
+    run_marmot_loop(_async_relay(args), _termination_handler)
 
 
 def _parse_args():
@@ -99,7 +119,10 @@ def _parse_args():
     parser.add_argument('url', type=URL, help="Destination URL")
     parser.add_argument('capath', type=Path, help="Destination CA path")
     parser.set_defaults(func=_relay)
-    return parser.parse_args()
+    args = parser.parse_args()
+    # built once, subscriptions reuse it as is
+    args.channels = frozenset(args.channels)
+    return args
 
 
 def app():
@@ -1,26 +1,59 @@
 """Marmot server
 """
 import typing as t
-from json import dumps
-from asyncio import CancelledError, Event, sleep, create_task
+from asyncio import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Event,
+    wait,
+    sleep,
+    gather,
+    create_task,
+)
 from pathlib import Path
 from argparse import ArgumentParser
 from aiohttp import web
 from aiohttp_sse import sse_response
 from .__version__ import version
 from .helper.api import MarmotAPIMessage
+from .helper.json import loads, dumps_bytes
+from .helper.loop import new_marmot_loop
 from .helper.config import MarmotConfig
 from .helper.logging import LOGGER
+from .helper.event_source import LINE_SEPARATOR, format_event
 from .helper.backend import MarmotServerBackend
 
 
 BANNER = f"Marmot Server {version}"
 
 
-async def _forward_messages_from(request, guid: str, channels: t.List[str]):
+async def _pull_messages(backend, guid: str, channels: t.Sequence[str]):
+    return [item async for item in backend.pull(channels, guid)]
+
+
+async def _wait_messages(
+    backend, guid: str, channels: t.Sequence[str], stop_event
+):
+    # pull blocks until messages are available, shutdown must not wait for it
+    pull_task = create_task(_pull_messages(backend, guid, channels))
+    stop_task = create_task(stop_event.wait())
+    try:
+        await wait((pull_task, stop_task), return_when=FIRST_COMPLETED)
+    finally:
+        stop_task.cancel()
+        if not pull_task.done():
+            pull_task.cancel()
+    if pull_task.cancelled():
+        return []
+    return pull_task.result()
+
+
+async def _forward_messages_from(
+    request, guid: str, channels: t.Sequence[str]
+):
     backend = request.app['backend']
     stop_event = request.app['stop_event']
-    async with sse_response(request, sep='\r\n') as resp:
+    async with sse_response(request, sep=LINE_SEPARATOR.decode()) as resp:
         # set ping interval
         unauthorized = False
         resp.ping_interval = 5
@@ -35,68 +68,85 @@ async def _forward_messages_from(request, guid: str, channels: t.List[str]):
             if unauthorized or stop_event.is_set():
                 await resp.send('reset', event='reset')
                 break
-            # retrieve next message from channel and forward it
-            async for message_id, message in backend.pull(channels, guid):
-                if message_id is None and message is None:
+            # retrieve pending messages from channels
+            pulled = []
+            for message_id, channel, payload in await _wait_messages(
+                backend, guid, channels, stop_event
+            ):
+                if message_id is None:
                     unauthorized = True
                     continue
-                await resp.send(dumps(message.to_dict()), event='whistle')
-                await backend.ack(message.channel, guid, message_id)
-            # sleep before processing next message
-            await sleep(1)
+                pulled.append((message_id, channel, payload))
+            if not pulled:
+                continue
+            # forward pulled messages in a single write, payloads are
+            # serialized by the whistler request handler
+            data = b''.join(
+                format_event('whistle', payload) for _, _, payload in pulled
+            )
+            try:
+                await resp.write(data)
+            except ConnectionResetError:
+                resp.stop_streaming()
+                raise
+            # stream ids are ordered, acknowledging the last message of each
+            # channel is enough
+            last_message_ids = {
+                channel: message_id for message_id, channel, _ in pulled
+            }
+            await backend.ack_many(guid, last_message_ids)
 
 
 async def _listen(request):
-    # NOTE: a semaphore might be needed here to limit the number of
-    #       simultaneous listeners
+    # NOTE: each listener waits for messages on its own redis connection,
+    #       listeners above redis.max_listeners are turned away
     try:
         guid = request.headers['X-Marmot-GUID']
-        channels = set(request.headers['X-Marmot-Channels'].split('|'))
+        channels_header = request.headers['X-Marmot-Channels']
         signature = request.headers['X-Marmot-Signature']
     except KeyError as exc:
         raise web.HTTPBadRequest from exc
+    # canonical form, sorted without duplicates, shared by authorization,
+    # pulls and log records
+    channels = tuple(sorted(set(channels_header.split('|'))))
+    client = (
+        guid,
+        request.remote,
+        request.headers.get('X-Forwarded-For'),
+        '|'.join(channels),
+    )
     backend = request.app['backend']
     can_listen = await backend.can_listen(guid, channels, signature)
-    channels = list(sorted(channels))
     if not can_listen:
         LOGGER.warning(
-            "client unauthorized listen attempt: (%s, %s, %s, %s)",
-            guid,
-            request.remote,
-            request.headers.get('X-Forwarded-For'),
-            channels,
+            "client unauthorized listen attempt: (%s, %s, %s, %s)", *client
         )
         raise web.HTTPForbidden
-    LOGGER.info(
-        "client is listening: (%s, %s, %s, %s)",
-        guid,
-        request.remote,
-        request.headers.get('X-Forwarded-For'),
-        channels,
-    )
+    if not backend.acquire_listener():
+        LOGGER.warning(
+            "max listeners reached, listen attempt rejected: "
+            "(%s, %s, %s, %s)",
+            *client,
+        )
+        raise web.HTTPServiceUnavailable
+    LOGGER.info("client is listening: (%s, %s, %s, %s)", *client)
     try:
         await _forward_messages_from(request, guid, channels)
-        LOGGER.info(
-            "server closed the connection: (%s, %s, %s, %s)",
-            guid,
-            request.remote,
-            request.headers.get('X-Forwarded-For'),
-            channels,
-        )
+        LOGGER.info("server closed the connection: (%s, %s, %s, %s)", *client)
     except ConnectionResetError:
-        LOGGER.info(
-            "client closed the connection: (%s, %s, %s, %s)",
-            guid,
-            request.remote,
-            request.headers.get('X-Forwarded-For'),
-            channels,
-        )
+        LOGGER.info("client closed the connection: (%s, %s, %s, %s)", *client)
+    finally:
+        backend.release_listener()
 
 
 async def _whistle(request):
     backend = request.app['backend']
-    body = await request.json()
-    if 'messages' not in body:
+    # raw body is decoded by the JSON helper directly, without a text copy
+    try:
+        body = loads(await request.read())
+    except ValueError as exc:
+        raise web.HTTPBadRequest from exc
+    if not isinstance(body, dict) or 'messages' not in body:
         raise web.HTTPBadRequest
     try:
         messages = [
@@ -105,6 +155,7 @@ async def _whistle(request):
     except (ValueError, KeyError) as exc:
         raise web.HTTPBadRequest from exc
     published = []
+    authorized = []
     for message in messages:
         can_whistle = await backend.can_whistle(message)
         if not can_whistle:
@@ -124,16 +175,21 @@ async def _whistle(request):
             request.headers.get('X-Forwarded-For'),
             message.channel,
         )
-        await backend.push(message)
+        authorized.append(message)
         published.append(True)
-    return web.json_response({'published': published})
+    # authorized messages are published in a single round trip
+    await backend.push_many(authorized)
+    return web.Response(
+        body=dumps_bytes({'published': published}),
+        content_type='application/json',
+    )
 
 
 async def _backend_trim_task(webapp):
-    """Trim backend channels every 20 seconds"""
+    """Trim backend channels periodically, pushes trigger trims as well"""
     config = webapp['config']
     backend = webapp['backend']
-    trim_freq = min(max(config.server.server.redis.trim_freq, 60), 3600)
+    trim_freq = min(max(config.server.redis.trim_freq, 60), 3600)
     while True:
         await backend.trim_all()
         await sleep(trim_freq)
@@ -156,20 +212,24 @@ async def _on_shutdown(webapp):
     LOGGER.info("shutting down...")
     webapp['stop_event'].set()
     LOGGER.info("terminating background tasks...")
-    for task in webapp['background_tasks']:
+    tasks = webapp['background_tasks']
+    for task in tasks:
         task.cancel()
         LOGGER.info("waiting for canceled task: %s", task.get_name())
-        try:
-            await task
-        except CancelledError:
-            LOGGER.info("task successfully canceled.")
-    await sleep(1)
+    # listeners notice the stop event by themselves, only background tasks
+    # need to be waited for
+    results = await gather(*tasks, return_exceptions=True)
+    for task, result in zip(tasks, results):
+        if isinstance(result, CancelledError):
+            LOGGER.info("task successfully canceled: %s", task.get_name())
+        elif isinstance(result, BaseException):
+            LOGGER.error("task failed: %s", task.get_name(), exc_info=result)
 
 
 async def _on_cleanup(webapp):
     LOGGER.info("cleaning up...")
+    # closing the backend waits for its connections to be released
     await webapp['backend'].close()
-    await sleep(1)
 
 
 def _parse_args():
@@ -192,6 +252,11 @@ def _parse_args():
         type=int,
         help="marmot redis max connections",
     )
+    parser.add_argument(
+        '--redis-max-listeners',
+        type=int,
+        help="marmot redis max listeners, one connection each",
+    )
     return parser.parse_args()
 
 
@@ -215,6 +280,8 @@ def app():
     webapp['backend'] = MarmotServerBackend(
         args.redis_url or config.server.redis.url,
         args.redis_max_connections or config.server.redis.max_connections,
+        config.server.redis.stream_maxlen,
+        args.redis_max_listeners or config.server.redis.max_listeners,
     )
     webapp['stop_event'] = Event()
     webapp.add_routes(
@@ -229,4 +296,4 @@ def app():
     webapp.on_startup.append(_on_startup)
     webapp.on_shutdown.append(_on_shutdown)
     webapp.on_cleanup.append(_on_cleanup)
-    web.run_app(webapp, host=host, port=port)
+    web.run_app(webapp, host=host, port=port, loop=new_marmot_loop())
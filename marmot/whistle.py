@@ -1,13 +1,14 @@
 """Marmot client
 """
+import sys
 from os import getenv
-from json import dumps
 from pathlib import Path
-from asyncio import new_event_loop
 from argparse import ArgumentParser
 from . import Marmot, MarmotRole, MarmotMessage
 from .__version__ import version
 from .helper.api import MARMOT_MESSAGE_LEVELS, MarmotMessageLevel
+from .helper.json import dumps
+from .helper.loop import run_marmot_loop
 from .helper.config import MarmotConfig, MarmotConfigError
 from .helper.logging import LOGGER
 from .helper.secret_provider import (
@@ -18,6 +19,12 @@ from .helper.secret_provider import (
 
 
 BANNER = f"Marmot Whistle {version}"
+LEVEL_HELP = (
+    f"marmot message level, one of {{{','.join(MARMOT_MESSAGE_LEVELS)}}}"
+)
+# string default, argparse converts it only when --level is not given and
+# reports invalid values as usage errors
+DEFAULT_LEVEL = getenv('MARMOT_MSG_LEVEL', MarmotMessageLevel.INFO.value)
 
 
 async def _async_whistle(args):
@@ -44,9 +51,7 @@ async def _async_whistle(args):
 
 
 def _whistle(args):
-    loop = new_event_loop()
-    loop.run_until_complete(_async_whistle(args))
-    loop.close()
+    run_marmot_loop(_async_whistle(args))
 
 
 def _parse_args():
@@ -58,6 +63,7 @@ def _parse_args():
         default=Path('marmot.json'),
         help="marmot configuration file",
     )
+    parser.add_argument('--version', action='version', version=version)
     parser.add_argument(
         '--secret-provider',
         '--sp',
@@ -70,8 +76,8 @@ def _parse_args():
         '--level',
         '-l',
         type=MarmotMessageLevel,
-        default=MarmotMessageLevel(getenv('MARMOT_MSG_LEVEL', 'INFO')),
-        help=f"marmot message level, one of {{{','.join(MARMOT_MESSAGE_LEVELS)}}}",
+        default=DEFAULT_LEVEL,
+        help=LEVEL_HELP,
     )
     parser.add_argument(
         '--channel',
@@ -89,7 +95,11 @@ def _parse_args():
 
 def app():
     """Aplication entrypoint"""
-    LOGGER.info(BANNER, extra={'highlighter': None})
+    argv = sys.argv[1:]
+    # argparse handles help and version, the first one prints the banner
+    # already and the second one only prints the version
+    if not {'--help', '-h', '--version'}.intersection(argv):
+        LOGGER.info(BANNER, extra={'highlighter': None})
     args = _parse_args()
     SECRET_PROVIDER.select(args.secret_provider)
     try:
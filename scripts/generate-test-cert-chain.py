@@ -2,66 +2,114 @@
 """Generate test certificate chain including test CA certificate
 
 TESTING ONLY, UNSAFE FOR PRODUCTION!
+
+Private key encryption relies on the OpenSSL build bundled with cryptography,
+which uses AES-NI when the CPU supports it. Set OPENSSL_ia32cap environment
+variable to mask CPU capabilities when comparing timings across hosts.
 """
+from __future__ import annotations
+from io import DEFAULT_BUFFER_SIZE
+from os import fsync
 from sys import exit as sys_exit
 import typing as t
-from uuid import uuid4
 from pathlib import Path
 from getpass import getpass
-from datetime import timedelta, datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone, datetime
 from argparse import ArgumentParser
 
-try:
+if t.TYPE_CHECKING:
     from cryptography.x509 import (
-        Name,
-        DNSName,
-        NameAttribute,
-        BasicConstraints,
-        SubjectAlternativeName,
         Certificate,
-        CertificateBuilder,
         CertificateSigningRequest,
-        CertificateSigningRequestBuilder,
-        random_serial_number,
     )
-    from cryptography.x509.oid import NameOID
-    from cryptography.hazmat.backends import default_backend
     from cryptography.hazmat.primitives.hashes import SHA256
-    from cryptography.hazmat.primitives.asymmetric.rsa import (
-        RSAPrivateKey,
-        generate_private_key,
-    )
-    from cryptography.hazmat.primitives.serialization import (
-        Encoding,
-        PrivateFormat,
-        NoEncryption,
-        BestAvailableEncryption,
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+        Ed25519PrivateKey,
     )
-except ImportError:
-    print("please install 'cryptography' package.")
-    sys_exit(1)
+
+    PrivateKey = t.Union[Ed25519PrivateKey, RSAPrivateKey]
 
 
-UTC_NOW = datetime.utcnow()
 ONE_DAY = timedelta(days=1)
 ONE_MONTH = timedelta(days=30)
 ONE_YEAR = timedelta(days=365)
 
 
-PrivateKey = RSAPrivateKey
+def _import_crypto():
+    # cryptography is imported once arguments are parsed, --help and argument
+    # errors do not pay for it
+    global Name, DNSName, NameAttribute, BasicConstraints
+    global SubjectAlternativeName, CertificateBuilder
+    global CertificateSigningRequestBuilder, random_serial_number, NameOID
+    global generate_private_key, Ed25519PrivateKey
+    global Encoding, PrivateFormat, NoEncryption, BestAvailableEncryption
+    global BACKEND, SIGNATURE_HASH
+    try:
+        from cryptography.x509 import (
+            Name,
+            DNSName,
+            NameAttribute,
+            BasicConstraints,
+            SubjectAlternativeName,
+            CertificateBuilder,
+            CertificateSigningRequestBuilder,
+            random_serial_number,
+        )
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives.hashes import SHA256
+        from cryptography.hazmat.primitives.asymmetric.rsa import (
+            generate_private_key,
+        )
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+            Ed25519PrivateKey,
+        )
+        from cryptography.hazmat.primitives.serialization import (
+            Encoding,
+            PrivateFormat,
+            NoEncryption,
+            BestAvailableEncryption,
+        )
+    except ImportError:
+        print("please install 'cryptography' package.")
+        sys_exit(1)
+    # backend and hash algorithm are stateless, share them between calls
+    BACKEND = default_backend()
+    SIGNATURE_HASH = SHA256()
 
 
-def _write_file(filepath: Path, data: bytes):
+def _write_file(filepath: Path, data: bytes, durable: bool = False):
     print(f"writing: {filepath}")
-    filepath.write_bytes(data)
+    with filepath.open('wb', buffering=DEFAULT_BUFFER_SIZE) as fobj:
+        fobj.write(data)
+        if durable:
+            fobj.flush()
+            fsync(fobj.fileno())
 
 
-def _generate_private_key(
-    keypath: Path, passphrase: t.Optional[str] = None
-) -> PrivateKey:
-    private_key = generate_private_key(
-        public_exponent=65537, key_size=2048, backend=default_backend()
-    )
+def _signature_algorithm(private_key: PrivateKey) -> t.Optional[SHA256]:
+    # Ed25519 dictates its own digest, passing one is an error
+    if isinstance(private_key, Ed25519PrivateKey):
+        return None
+    return SIGNATURE_HASH
+
+
+def _generate_private_key(args) -> PrivateKey:
+    if args.algo == 'rsa':
+        return generate_private_key(
+            public_exponent=65537, key_size=2048, backend=BACKEND
+        )
+    return Ed25519PrivateKey.generate()
+
+
+def _write_private_key(
+    args,
+    keypath: Path,
+    private_key: PrivateKey,
+    passphrase: t.Optional[str] = None,
+):
     encryption_algorithm = NoEncryption()
     if passphrase:
         encryption_algorithm = BestAvailableEncryption(passphrase.encode())
@@ -69,18 +117,22 @@ def _generate_private_key(
         keypath,
         private_key.private_bytes(
             encoding=Encoding.PEM,
-            format=PrivateFormat.TraditionalOpenSSL,
+            format=PrivateFormat.PKCS8,
             encryption_algorithm=encryption_algorithm,
         ),
+        args.durable,
     )
-    return private_key
 
 
-def _generate_ca(output_directory: Path) -> t.Tuple[PrivateKey, Certificate]:
-    keypath = output_directory / 'marmot.ca.key.pem'
-    crtpath = output_directory / 'marmot.ca.crt.pem'
-    passphrase = getpass("please type CA key passphrase: ")
-    ca_key = _generate_private_key(keypath, passphrase)
+def _generate_ca(
+    args,
+    utc_now: datetime,
+    ca_key: PrivateKey,
+    passphrase: t.Optional[str],
+) -> Certificate:
+    keypath = args.output_directory / 'marmot.ca.key.pem'
+    crtpath = args.output_directory / 'marmot.ca.crt.pem'
+    _write_private_key(args, keypath, ca_key, passphrase)
     subject = issuer = Name(
         [
             NameAttribute(NameOID.COMMON_NAME, "Marmot Test CA"),
@@ -94,28 +146,32 @@ def _generate_ca(output_directory: Path) -> t.Tuple[PrivateKey, Certificate]:
         CertificateBuilder()
         .subject_name(subject)
         .issuer_name(issuer)
-        .not_valid_before(UTC_NOW - ONE_DAY)
-        .not_valid_after(UTC_NOW + ONE_YEAR)
-        .serial_number(int(uuid4()))
+        .not_valid_before(utc_now - ONE_DAY)
+        .not_valid_after(utc_now + ONE_YEAR)
+        .serial_number(random_serial_number())
         .public_key(ca_key.public_key())
         .add_extension(
             BasicConstraints(ca=True, path_length=None),
             critical=True,
         )
         .sign(
-            private_key=ca_key, algorithm=SHA256(), backend=default_backend()
+            private_key=ca_key,
+            algorithm=_signature_algorithm(ca_key),
+            backend=BACKEND,
         )
     )
-    _write_file(crtpath, ca_crt.public_bytes(encoding=Encoding.PEM))
-    return ca_key, ca_crt
+    _write_file(
+        crtpath, ca_crt.public_bytes(encoding=Encoding.PEM), args.durable
+    )
+    return ca_crt
 
 
 def _generate_csr(
-    common_name: str, output_directory: Path
+    args, common_name: str, private_key: PrivateKey
 ) -> CertificateSigningRequest:
-    keypath = output_directory / f'{common_name}.key.pem'
-    csrpath = output_directory / f'{common_name}.csr.pem'
-    private_key = _generate_private_key(keypath)
+    keypath = args.output_directory / f'{common_name}.key.pem'
+    csrpath = args.output_directory / f'{common_name}.csr.pem'
+    _write_private_key(args, keypath, private_key)
     csr = (
         CertificateSigningRequestBuilder()
         .subject_name(
@@ -139,31 +195,32 @@ def _generate_csr(
             ),
             critical=False,
         )
-        .sign(private_key, SHA256())
+        .sign(private_key, _signature_algorithm(private_key))
     )
-    _write_file(csrpath, csr.public_bytes(Encoding.PEM))
+    _write_file(csrpath, csr.public_bytes(Encoding.PEM), args.durable)
     return csr
 
 
 def _sign_csr(
+    args,
+    utc_now: datetime,
     common_name: str,
-    output_directory: Path,
     csr: CertificateSigningRequest,
     ca_key: PrivateKey,
     ca_crt: Certificate,
 ) -> Certificate:
-    crtpath = output_directory / f'{common_name}.crt.pem'
+    crtpath = args.output_directory / f'{common_name}.crt.pem'
     crt = (
         CertificateBuilder()
         .subject_name(csr.subject)
         .issuer_name(ca_crt.subject)
         .public_key(csr.public_key())
         .serial_number(random_serial_number())
-        .not_valid_before(UTC_NOW - ONE_DAY)
-        .not_valid_after(UTC_NOW + ONE_MONTH)
-        .sign(ca_key, SHA256())
+        .not_valid_before(utc_now - ONE_DAY)
+        .not_valid_after(utc_now + ONE_MONTH)
+        .sign(ca_key, _signature_algorithm(ca_key))
     )
-    _write_file(crtpath, crt.public_bytes(Encoding.PEM))
+    _write_file(crtpath, crt.public_bytes(Encoding.PEM), args.durable)
     return crt
 
 
@@ -186,18 +243,51 @@ def _parse_args():
         default=['api.marmot.org'],
         help="Certificate common name",
     )
+    parser.add_argument(
+        '--algo',
+        choices=('ed25519', 'rsa'),
+        default='ed25519',
+        help="Key algorithm, RSA keys are 2048 bits long",
+    )
+    parser.add_argument(
+        '--rsa',
+        dest='algo',
+        action='store_const',
+        const='rsa',
+        help="Same as --algo rsa",
+    )
+    parser.add_argument(
+        '--durable',
+        action='store_true',
+        help="Flush written files to disk before returning",
+    )
     return parser.parse_args()
 
 
 def app():
     """Application entry point"""
     args = _parse_args()
+    _import_crypto()
+    # all certificates share the same validity start
+    utc_now = datetime.now(timezone.utc)
+    print(f"using: {BACKEND.openssl_version_text()}")
     args.output_directory /= 'ssl'
     args.output_directory.mkdir(parents=True, exist_ok=True)
-    ca_key, ca_crt = _generate_ca(args.output_directory)
-    for common_name in args.common_names:
-        csr = _generate_csr(common_name, args.output_directory)
-        _sign_csr(common_name, args.output_directory, csr, ca_key, ca_crt)
+    # key generation is independent for each certificate, generate all keys
+    # concurrently and only then build certificates sequentially
+    with ThreadPoolExecutor() as executor:
+        ca_key_future = executor.submit(_generate_private_key, args)
+        key_futures = {
+            common_name: executor.submit(_generate_private_key, args)
+            for common_name in args.common_names
+        }
+        # prompt while keys are being generated
+        passphrase = getpass("please type CA key passphrase: ")
+        ca_key = ca_key_future.result()
+        ca_crt = _generate_ca(args, utc_now, ca_key, passphrase)
+        for common_name, key_future in key_futures.items():
+            csr = _generate_csr(args, common_name, key_future.result())
+            _sign_csr(args, utc_now, common_name, csr, ca_key, ca_crt)
 
 
 if __name__ == '__main__':
@@ -2,6 +2,7 @@
 """Generate test configuration
 """
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser
 from marmot.helper.crypto import generate_marmot_private_key
 from marmot.helper.config import (
@@ -43,8 +44,7 @@ def _write_config(filepath: Path, fs_config: MarmotConfig):
     fs_config.to_filepath(filepath)
 
 
-def _create_client(args, guid: str):
-    private_key = generate_marmot_private_key()
+def _create_client(args, guid: str, private_key):
     fs_config = MarmotConfig(
         client=MarmotClientConfig(
             guid=guid,
@@ -55,6 +55,8 @@ def _create_client(args, guid: str):
             prikey=private_key,
         )
     )
+    # each client private key is protected by its own generated secret
+    SECRET_PROVIDER.invalidate()
     _write_config(args.output_directory / f'mc-{guid}.json', fs_config)
     return private_key.public_key()
 
@@ -79,18 +81,29 @@ def app():
     args.output_directory /= 'config'
     args.output_directory.mkdir(parents=True, exist_ok=True)
     SECRET_PROVIDER.select(SecretProviderBackend.GENPASS)
-    clients = {}
+    guids = list(
+        dict.fromkeys(
+            guid
+            for members in CHANNELS.values()
+            for guid in (*members[LISTENERS], *members[WHISTLERS])
+        )
+    )
+    # key generation is independent for each client, generate all keys
+    # concurrently then write configurations sequentially to keep printed
+    # secrets next to their configuration
+    with ThreadPoolExecutor() as executor:
+        key_futures = [
+            executor.submit(generate_marmot_private_key) for _ in guids
+        ]
+        clients = {
+            guid: _create_client(args, guid, key_future.result())
+            for guid, key_future in zip(guids, key_futures)
+        }
     channels = {}
     for channel, members in CHANNELS.items():
         channels[channel] = MarmotChannelConfig()
-        for listener in members[LISTENERS]:
-            if listener not in clients:
-                clients[listener] = _create_client(args, listener)
-            channels[channel].listeners.add(listener)
-        for whistler in members[WHISTLERS]:
-            if whistler not in clients:
-                clients[whistler] = _create_client(args, whistler)
-            channels[channel].whistlers.add(whistler)
+        channels[channel].listeners.update(members[LISTENERS])
+        channels[channel].whistlers.update(members[WHISTLERS])
     fs_config = MarmotConfig(
         server=MarmotServerConfig(
             host='0.0.0.0',
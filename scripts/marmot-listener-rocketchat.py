@@ -2,9 +2,13 @@
 """Marmot listener script to forward messages in RocketChat channel
 """
 from os import getenv
+from sys import exit as sys_exit
 from pprint import pprint
-from asyncio import new_event_loop
-from aiohttp import ClientSession
+
+try:
+    from uvloop import new_event_loop
+except ImportError:
+    from asyncio import new_event_loop
 
 # ----- BEGIN CONFIGURATION -----
 ROCKETCHAT_BASE_URL = 'https://rocketchat.marmot.org'
@@ -29,29 +33,39 @@ MARMOT_MSG_LEVEL = getenv('MARMOT_MSG_LEVEL')
 MARMOT_MSG_CHANNEL = getenv('MARMOT_MSG_CHANNEL')
 MARMOT_MSG_CONTENT = getenv('MARMOT_MSG_CONTENT')
 MARMOT_MSG_WHISTLER = getenv('MARMOT_MSG_WHISTLER')
+MARMOT_DEBUG = getenv('MARMOT_DEBUG')
 # rocketchat environment variables
 ROCKETCHAT_USER_ID = getenv('ROCKETCHAT_USER_ID')
 ROCKETCHAT_AUTH_TOKEN = getenv('ROCKETCHAT_AUTH_TOKEN')
+# message dependent values, resolved once before connecting
+ROCKETCHAT_CHANNEL = MARMOT_ROCKETCHAT_CHANNEL_MAPPING.get(
+    MARMOT_MSG_CHANNEL, ROCKETCHAT_DEFAULT_CHANNEL
+)
+ROCKETCHAT_EMOJI = MARMOT_ROCKETCHAT_LEVEL_MAPPING.get(MARMOT_MSG_LEVEL)
 
 async def _post_message(http_client):
     async with http_client.post(
         ROCKETCHAT_POST_MSG_ENDPOINT,
         json={
-            'channel': MARMOT_ROCKETCHAT_CHANNEL_MAPPING.get(
-                MARMOT_MSG_CHANNEL, ROCKETCHAT_DEFAULT_CHANNEL
-            ),
-            'emoji': MARMOT_ROCKETCHAT_LEVEL_MAPPING[MARMOT_MSG_LEVEL],
+            'channel': ROCKETCHAT_CHANNEL,
+            'emoji': ROCKETCHAT_EMOJI,
             'alias': MARMOT_MSG_WHISTLER,
             'text': MARMOT_MSG_CONTENT,
         },
     ) as response:
-        body = await response.json()
-        pprint(body)
+        # session raises for error status codes, the reply is only decoded
+        # for debugging purposes
+        if MARMOT_DEBUG:
+            pprint(await response.json())
 
 
 async def _async_app():
+    from aiohttp import TCPConnector, ClientSession
+
+    # a single message is posted per invocation, one connection is enough
     async with ClientSession(
         base_url=ROCKETCHAT_BASE_URL,
+        connector=TCPConnector(limit=1),
         headers={
             'X-User-Id': ROCKETCHAT_USER_ID,
             'X-Auth-Token': ROCKETCHAT_AUTH_TOKEN,
@@ -66,6 +80,9 @@ async def _async_app():
 
 def app():
     """Application entrypoint"""
+    if ROCKETCHAT_EMOJI is None:
+        print(f"unknown marmot message level: {MARMOT_MSG_LEVEL}")
+        sys_exit(1)
     loop = new_event_loop()
     loop.run_until_complete(_async_app())
     loop.close()
@@ -2,8 +2,12 @@
 """Marmot listener script to forward messages in Slack channel
 """
 from os import getenv
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from sys import exit as sys_exit
+
+try:
+    from uvloop import new_event_loop
+except ImportError:
+    from asyncio import new_event_loop
 
 # ----- BEGIN CONFIGURATION -----
 SLACK_BASE_URL = 'https://slack.marmot.org'
@@ -30,17 +34,23 @@ MARMOT_MSG_CONTENT = getenv('MARMOT_MSG_CONTENT')
 MARMOT_MSG_WHISTLER = getenv('MARMOT_MSG_WHISTLER')
 # slack environment variables
 SLACK_BOT_TOKEN = getenv('SLACK_BOT_TOKEN')
+# message dependent values, resolved once before connecting
+SLACK_CHANNEL = MARMOT_SLACK_CHANNEL_MAPPING.get(
+    MARMOT_MSG_CHANNEL, SLACK_DEFAULT_CHANNEL
+)
+SLACK_EMOJI = MARMOT_SLACK_LEVEL_MAPPING.get(MARMOT_MSG_LEVEL)
 
 
-def app():
-    """Application entrypoint"""
-    client = WebClient(token=SLACK_BOT_TOKEN)
+async def _async_app():
+    # aiohttp based client, same HTTP stack as the other listener scripts
+    from slack_sdk.errors import SlackApiError
+    from slack_sdk.web.async_client import AsyncWebClient
+
+    client = AsyncWebClient(token=SLACK_BOT_TOKEN)
     try:
-        result = client.chat_postMessage(
-            channel=MARMOT_SLACK_CHANNEL_MAPPING.get(
-                MARMOT_MSG_CHANNEL, SLACK_DEFAULT_CHANNEL
-            ),
-            icon_emoji=MARMOT_SLACK_LEVEL_MAPPING[MARMOT_MSG_LEVEL],
+        result = await client.chat_postMessage(
+            channel=SLACK_CHANNEL,
+            icon_emoji=SLACK_EMOJI,
             text=MARMOT_MSG_CONTENT,
             username=MARMOT_MSG_WHISTLER,
         )
@@ -48,5 +58,16 @@ def app():
     except SlackApiError:
         print("failed!")
 
+
+def app():
+    """Application entrypoint"""
+    if SLACK_EMOJI is None:
+        print(f"unknown marmot message level: {MARMOT_MSG_LEVEL}")
+        sys_exit(1)
+    loop = new_event_loop()
+    loop.run_until_complete(_async_app())
+    loop.close()
+
+
 if __name__ == '__main__':
     app()
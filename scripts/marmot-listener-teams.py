@@ -2,9 +2,13 @@
 """Marmot listener script to forward messages in Teams channel
 """
 from os import getenv
+from sys import exit as sys_exit
 from pprint import pprint
-from asyncio import new_event_loop
-from aiohttp import ClientSession
+
+try:
+    from uvloop import new_event_loop
+except ImportError:
+    from asyncio import new_event_loop
 
 # ----- BEGIN CONFIGURATION -----
 TEAMS_TEAM_ID = 'fbe2bf47-16c8-47cf-b4a5-4b9b187c508b'
@@ -29,14 +33,17 @@ MARMOT_MSG_LEVEL = getenv('MARMOT_MSG_LEVEL')
 MARMOT_MSG_CHANNEL = getenv('MARMOT_MSG_CHANNEL')
 MARMOT_MSG_CONTENT = getenv('MARMOT_MSG_CONTENT')
 MARMOT_MSG_WHISTLER = getenv('MARMOT_MSG_WHISTLER')
+MARMOT_DEBUG = getenv('MARMOT_DEBUG')
 # teams environment variables
 TEAMS_AUTH_TOKEN = getenv('TEAMS_AUTH_TOKEN')
+# message dependent values, resolved once before connecting
+TEAMS_CHANNEL = MARMOT_TEAMS_CHANNEL_MAPPING.get(
+    MARMOT_MSG_CHANNEL, TEAMS_DEFAULT_CHANNEL
+)
+TEAMS_IMPORTANCE = MARMOT_TEAMS_LEVEL_MAPPING.get(MARMOT_MSG_LEVEL)
 
 async def _post_message(http_client):
-    channel = MARMOT_TEAMS_CHANNEL_MAPPING.get(
-        MARMOT_MSG_CHANNEL, TEAMS_DEFAULT_CHANNEL
-    )
-    teams_post_msg_endpoint = f'/teams/{TEAMS_TEAM_ID}/channels/{channel}/messages'
+    teams_post_msg_endpoint = f'/teams/{TEAMS_TEAM_ID}/channels/{TEAMS_CHANNEL}/messages'
     async with http_client.post(
         teams_post_msg_endpoint,
         json={
@@ -44,16 +51,22 @@ async def _post_message(http_client):
             'content': MARMOT_MSG_CONTENT,
           },
           'subject': MARMOT_MSG_WHISTLER, # might not be the best field to use for this
-          'importance': MARMOT_TEAMS_LEVEL_MAPPING[MARMOT_MSG_LEVEL],
+          'importance': TEAMS_IMPORTANCE,
         },
     ) as response:
-        body = await response.json()
-        pprint(body)
+        # session raises for error status codes, the reply is only decoded
+        # for debugging purposes
+        if MARMOT_DEBUG:
+            pprint(await response.json())
 
 
 async def _async_app():
+    from aiohttp import TCPConnector, ClientSession
+
+    # a single message is posted per invocation, one connection is enough
     async with ClientSession(
         base_url=TEAMS_BASE_URL,
+        connector=TCPConnector(limit=1),
         headers={
             'Authorization': f'Bearer {TEAMS_AUTH_TOKEN}',
         },
@@ -67,6 +80,9 @@ async def _async_app():
 
 def app():
     """Application entrypoint"""
+    if TEAMS_IMPORTANCE is None:
+        print(f"unknown marmot message level: {MARMOT_MSG_LEVEL}")
+        sys_exit(1)
     loop = new_event_loop()
     loop.run_until_complete(_async_app())
     loop.close()
@@ -4,28 +4,82 @@ syslog-ng program() function
 """
 from sys import stdin
 from pathlib import Path
-from asyncio import new_event_loop
+from asyncio import (
+    Queue,
+    TimeoutError as AsyncTimeoutError,
+    wait_for,
+    get_running_loop,
+    run_coroutine_threadsafe,
+)
 from argparse import ArgumentParser
+from threading import Thread
 from marmot import Marmot, MarmotRole, MarmotMessage
 from marmot.helper.api import MarmotMessageLevel
 from marmot.helper.config import MarmotConfig, MarmotConfigError
+from marmot.helper.loop import run_marmot_loop
 from marmot.helper.logging import LOGGER
 from marmot.helper.secret_provider import (
     SECRET_PROVIDER, SecretProviderBackend
 )
 
 
+# lines whistled per request, configure program() with flush-lines() so that
+# syslog-ng writes lines in bursts
+WHISTLE_CHUNK_SIZE = 256
+WHISTLE_PENDING_CHUNKS = 4
+# seconds a partial chunk waits for more lines before being whistled
+WHISTLE_FLUSH_DELAY = 1.0
+# ----- BEGIN CONFIGURATION -----
+DEFAULT_CHANNEL = 'default'
+DEFAULT_LEVEL = MarmotMessageLevel.DEBUG
+# ----- END   CONFIGURATION -----
+
+
+def _read_lines(loop, lines: Queue):
+    # reading stdin blocks and cannot be interrupted, this runs in a daemon
+    # thread so that the script exits without waiting for the next line
+    try:
+        try:
+            for line in stdin:
+                run_coroutine_threadsafe(lines.put(line), loop).result()
+        except Exception:
+            LOGGER.exception("failed to read syslog lines!")
+        # notify the whistling loop that there is nothing left to whistle
+        run_coroutine_threadsafe(lines.put(None), loop).result()
+    except RuntimeError:
+        # event loop is closed, the script is exiting
+        pass
+
+
+async def _read_chunk(lines: Queue):
+    # messages are sent every WHISTLE_CHUNK_SIZE lines or once no line was
+    # received for WHISTLE_FLUSH_DELAY, None means stdin is closed
+    line = await lines.get()
+    if line is None:
+        return None
+    chunk = [line]
+    loop = get_running_loop()
+    deadline = loop.time() + WHISTLE_FLUSH_DELAY
+    while len(chunk) < WHISTLE_CHUNK_SIZE:
+        try:
+            line = await wait_for(lines.get(), deadline - loop.time())
+        except AsyncTimeoutError:
+            break
+        if line is None:
+            # whistle this chunk, next call reports the end of stdin
+            lines.put_nowait(None)
+            break
+        chunk.append(line)
+    return [_message_from_line(line.rstrip('\r\n')) for line in chunk]
+
+
 def _message_from_line(line) -> MarmotMessage:
     # ----- BEGIN CUSTOM LINE PROCESSING -----
-    channel = 'default'
+    channel = DEFAULT_CHANNEL
     content = line
-    level = MarmotMessageLevel.DEBUG
+    level = DEFAULT_LEVEL
     # ----- END   CUSTOM LINE PROCESSING -----
-    return MarmotMessage(
-        channel=channel,
-        content=content,
-        level=level,
-    )
+    return MarmotMessage(channel, content, level)
 
 
 async def _async_whistle(args):
@@ -33,18 +87,29 @@ async def _async_whistle(args):
     if not config.client:
         LOGGER.error("cannot find client configuration in: %s", args.config)
         return
+    # a single session sends every chunk, connections are kept alive
+    # between requests
     async with Marmot.create_client(MarmotRole.WHISTLER, config) as client:
         marmot = Marmot(config, client)
-        published = await marmot.whistle(
-            [_message_from_line(line.rstrip()) for line in stdin]
-        )
-        print(published)
+        # next lines are read while the current chunk is whistled, chunks
+        # are whistled in order
+        lines = Queue(maxsize=WHISTLE_CHUNK_SIZE * WHISTLE_PENDING_CHUNKS)
+        Thread(
+            target=_read_lines,
+            args=(get_running_loop(), lines),
+            name='stdin-reader',
+            daemon=True,
+        ).start()
+        while True:
+            messages = await _read_chunk(lines)
+            if messages is None:
+                break
+            published = await marmot.whistle(messages)
+            print(published)
 
 
 def _whistle(args):
-    loop = new_event_loop()
-    loop.run_until_complete(_async_whistle(args))
-    loop.close()
+    run_marmot_loop(_async_whistle(args))
 
 
 def _parse_args():